@@ -0,0 +1,573 @@
+from threading import Thread
+from itertools import count
+
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import websockets
+
+from Scraper import create_results_saver, get_blocked_url_patterns
+from Steps import HashtagSteps, ProfileSteps, Script, WaitFor, Load, CurrentUrl, Prefetch, Sleep, Call, run_steps_async
+
+from utils import *
+
+# Names of the Chrome executable, if CHROME_BINARY is not set
+CHROME_BINARIES = ['google-chrome', 'google-chrome-stable', 'chromium', 'chromium-browser']
+
+class CDPException(Exception):
+    """"""
+    pass
+
+def find_chrome():
+    """
+        Helper to get the path of the Chrome executable.
+    """
+    if os.getenv('CHROME_BINARY'):
+        return os.getenv('CHROME_BINARY')
+
+    for binary in CHROME_BINARIES:
+        path = shutil.which(binary)
+        if path is not None:
+            return path
+
+    raise FileNotFoundError("Chrome not found. Set CHROME_BINARY to the path of the Chrome executable.")
+
+class Chrome():
+    """
+        Chrome instance driven directly over the DevTools protocol, without chromedriver. All pages share one
+        websocket connection to the browser. Commands are matched to their responses by id and events are routed to
+        their page by session id, so that one event loop can drive many pages at once.
+    """
+
+    def __init__(self, block_resources=None):
+        self.block_resources = block_resources
+
+        self.ids = count(1)
+        self.pending = {}
+        self.pages = {}
+
+        self.process = None
+        self.connection = None
+        self.reader = None
+        self.user_data_dir = None
+
+    async def launch(self, timeout=30):
+        self.user_data_dir = tempfile.mkdtemp()
+
+        args = [find_chrome(), '--headless', '--no-sandbox', '--no-first-run', '--no-default-browser-check',
+                '--remote-debugging-port=0', '--user-data-dir=' + self.user_data_dir]
+
+        self.process = await asyncio.create_subprocess_exec(*args, 'about:blank', stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL)
+
+        # Chrome writes the port and path of its websocket to the profile folder
+        port_file = os.path.join(self.user_data_dir, 'DevToolsActivePort')
+        end_time = time.time() + timeout
+        while True:
+            if os.path.exists(port_file):
+                with open(port_file, 'r') as infile:
+                    lines = infile.read().split('\n')
+                if len(lines) >= 2 and lines[1]:
+                    break
+
+            if time.time() >= end_time:
+                raise CDPException('Chrome did not start within ' + str(timeout) + ' seconds')
+
+            await asyncio.sleep(0.1)
+
+        self.connection = await websockets.connect('ws://127.0.0.1:' + lines[0] + lines[1], max_size=None)
+        self.reader = asyncio.ensure_future(self.read())
+
+    async def read(self):
+        """
+            Dispatch the messages of the browser: Responses to the waiting commands, events to their page.
+        """
+        try:
+            async for message in self.connection:
+                message = json.loads(message)
+
+                if 'id' in message:
+                    future = self.pending.pop(message['id'], None)
+                    if future is None or future.done():
+                        continue
+
+                    if 'error' in message:
+                        future.set_exception(CDPException(message['error'].get('message', '')))
+                    else:
+                        future.set_result(message.get('result', {}))
+
+                elif message.get('sessionId') in self.pages:
+                    self.pages[message['sessionId']].dispatch(message['method'], message.get('params', {}))
+
+        except websockets.ConnectionClosed:
+            pass
+
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(CDPException('Connection to Chrome closed'))
+            self.pending = {}
+
+    async def send(self, method, params=None, session_id=None):
+        """
+            Send a command and wait for its result. Commands of a page are sent with its session id.
+        """
+        message = {'id': next(self.ids), 'method': method, 'params': params or {}}
+        if session_id is not None:
+            message['sessionId'] = session_id
+
+        future = asyncio.get_event_loop().create_future()
+        self.pending[message['id']] = future
+
+        await self.connection.send(json.dumps(message))
+
+        return await future
+
+    async def new_page(self):
+        """
+            Open a new tab and attach to it.
+        """
+        target = await self.send('Target.createTarget', {'url': 'about:blank'})
+        session = await self.send('Target.attachToTarget', {'targetId': target['targetId'], 'flatten': True})
+
+        page = Page(self, session['sessionId'], target['targetId'])
+        self.pages[page.session_id] = page
+
+        await page.send('Page.enable')
+
+        # Block requests by URL pattern
+        if self.block_resources:
+            await page.send('Network.enable')
+            await page.send('Network.setBlockedURLs', {'urls': get_blocked_url_patterns(self.block_resources)})
+
+        return page
+
+    async def get_cookies(self):
+        return (await self.send('Storage.getCookies'))['cookies']
+
+    async def set_cookies(self, cookies):
+        await self.send('Storage.setCookies', {'cookies': cookies})
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
+            await self.reader
+
+        if self.process is not None and self.process.returncode is None:
+            self.process.terminate()
+            await self.process.wait()
+
+        if self.user_data_dir is not None:
+            shutil.rmtree(self.user_data_dir, ignore_errors=True)
+
+class Page():
+    """
+        Tab of a Chrome instance, with the subset of the WebDriver API that the scrapers need.
+    """
+
+    def __init__(self, chrome, session_id, target_id):
+        self.chrome = chrome
+        self.session_id = session_id
+        self.target_id = target_id
+
+        # Futures waiting for an event, by event name
+        self.waiters = {}
+
+    def dispatch(self, method, params):
+        for future in self.waiters.pop(method, []):
+            if not future.done():
+                future.set_result(params)
+
+    def wait_for_event(self, method):
+        """
+            Get a future for the next event of the given name. Create it before triggering the event.
+        """
+        future = asyncio.get_event_loop().create_future()
+        self.waiters.setdefault(method, []).append(future)
+
+        return future
+
+    async def send(self, method, params=None):
+        return await self.chrome.send(method, params, self.session_id)
+
+    async def get(self, url, timeout=30):
+        """
+            Load the url and wait for the load event, but at most timeout seconds.
+        """
+        metrics.increment('navigations')
+
+        loaded = self.wait_for_event('Page.loadEventFired')
+        await self.send('Page.navigate', {'url': url})
+
+        try:
+            await asyncio.wait_for(loaded, timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def current_url(self):
+        return await self.execute_script("return window.location.href")
+
+    async def evaluate(self, expression, await_promise=False):
+        result = await self.send('Runtime.evaluate', {'expression': expression, 'returnByValue': True, 'awaitPromise': await_promise})
+
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            raise CDPException(details.get('exception', {}).get('description', details.get('text', '')))
+
+        return result['result'].get('value')
+
+    async def execute_script(self, script, *args):
+        """
+            Run a script like WebDriver does: The script is a function body, that gets args as arguments.
+        """
+        metrics.increment('execute_script_calls')
+
+        return await self.evaluate("(function() {" + script + "\n}).apply(null, " + json.dumps(list(args)) + ")")
+
+    async def execute_async_script(self, script, *args):
+        """
+            Run an asynchronous script like WebDriver does: The last argument is the callback for the result.
+        """
+        metrics.increment('execute_script_calls')
+
+        expression = ("new Promise(function(resolve) { (function() {" + script + "\n}).apply(null, " +
+                      json.dumps(list(args)) + ".concat([resolve])); })")
+
+        return await self.evaluate(expression, await_promise=True)
+
+    async def wait_for_condition(self, condition, timeout=5, poll_frequency=0.1):
+        """
+            Wait until the javascript expression condition is true, but at most timeout seconds. Returns, if the
+            condition has been met.
+        """
+        end_time = time.time() + timeout
+
+        while True:
+            try:
+                if await self.execute_script("return (" + condition + ");"):
+                    return True
+            except CDPException:
+                pass
+
+            if time.time() >= end_time:
+                return False
+
+            await asyncio.sleep(poll_frequency)
+
+    async def close(self):
+        self.chrome.pages.pop(self.session_id, None)
+        await self.chrome.send('Target.closeTarget', {'targetId': self.target_id})
+
+async def session_login(chrome, page, linkedin_username, linkedin_password, cookie_file):
+    """
+        Login to LinkedIn with the cookies stored in cookie_file, which is shared with the Selenium scrapers. Only if
+        the stored session has expired, login with the credentials and store the cookies of the new session.
+    """
+
+    # Try to restore the stored session
+    if os.path.exists(cookie_file):
+        with open(cookie_file, 'r') as infile:
+            cookies = json.load(infile)
+
+        await chrome.set_cookies([cookie_to_cdp(cookie) for cookie in cookies if cookie.get('expiry', time.time() + 1) > time.time()])
+
+        # A valid session is not redirected to the login page
+        await page.get(LINKEDIN_URL + '/feed/')
+        if await page.current_url() == LINKEDIN_URL + "/feed/":
+            return
+
+    # Login with credentials
+    await page.get(LINKEDIN_URL + '/uas/login')
+
+    loaded = page.wait_for_event('Page.loadEventFired')
+    await page.execute_script(
+        "document.getElementById('username').value = arguments[0];" +
+        "document.getElementById('password').value = arguments[1];" +
+        "document.getElementById('password').form.submit();",
+        linkedin_username, linkedin_password
+    )
+    await asyncio.wait_for(loaded, 30)
+
+    # Check, if we are on the correct page. After login, we should've been redirected to the feed
+    if not await page.current_url() == LINKEDIN_URL + "/feed/":
+        raise AuthenticationException()
+
+    # Store cookies in the format of Selenium
+    cookies = [cookie_from_cdp(cookie) for cookie in await chrome.get_cookies()]
+
+    with open(cookie_file + '.tmp', 'w') as outfile:
+        json.dump(cookies, outfile)
+
+    os.replace(cookie_file + '.tmp', cookie_file)
+
+def cookie_to_cdp(cookie):
+    """
+        Helper to convert a cookie stored by Selenium to the DevTools protocol.
+    """
+    cdp_cookie = dict(name=cookie['name'], value=cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'),
+                      secure=cookie.get('secure', False), httpOnly=cookie.get('httpOnly', False))
+    if 'expiry' in cookie:
+        cdp_cookie['expires'] = cookie['expiry']
+    if 'sameSite' in cookie:
+        cdp_cookie['sameSite'] = cookie['sameSite']
+
+    return cdp_cookie
+
+def cookie_from_cdp(cdp_cookie):
+    """
+        Helper to convert a cookie of the DevTools protocol to the format of Selenium.
+    """
+    cookie = dict(name=cdp_cookie['name'], value=cdp_cookie['value'], domain=cdp_cookie['domain'], path=cdp_cookie['path'],
+                  secure=cdp_cookie['secure'], httpOnly=cdp_cookie['httpOnly'])
+    if not cdp_cookie.get('session', False):
+        cookie['expiry'] = int(cdp_cookie['expires'])
+    if 'sameSite' in cdp_cookie:
+        cookie['sameSite'] = cdp_cookie['sameSite']
+
+    return cookie
+
+async def acquire(scheduler):
+    """
+        Helper to wait for the scheduler without blocking the event loop.
+    """
+    await asyncio.get_event_loop().run_in_executor(None, scheduler.acquire)
+
+async def iterate_queue_async(queue):
+    """
+        Helper to iterate over a queue like iterate_queue, but without blocking the event loop: Leases of a work queue
+        are taken in an executor and waiting for items to arrive or leases to end is done with asyncio.sleep, so that
+        the other pages go on in the meantime.
+    """
+    loop = asyncio.get_event_loop()
+
+    if isinstance(queue, WorkQueue):
+        while True:
+            item = await loop.run_in_executor(None, queue.lease)
+            if item is not None:
+                yield item
+                continue
+
+            if await loop.run_in_executor(None, queue.is_drained):
+                return
+
+            await asyncio.sleep(queue.poll_interval)
+
+    while True:
+        # Check before taking an item, as the last items might be added in between
+        finished = not isinstance(queue, StreamingQueue) or queue.finished.is_set()
+
+        try:
+            yield queue.get_nowait()
+        except Empty:
+            if finished:
+                if getattr(queue, 'error', None) is not None:
+                    raise queue.error
+                return
+
+            await asyncio.sleep(0.05)
+
+class AsyncScraperPool(Thread):
+    """
+        Run one kind of async scraper on several pages of a single Chrome instance, driven from one event loop. All
+        pages share one login, the input queue and the results saver.
+    """
+
+    def __init__(self, scraper_class, num_pages, linkedin_username, linkedin_password, items, output_format='json', output_folder='../output/', resume=False, block_resources=None, scheduler=None, **kwargs):
+
+        # Initialize thread
+        Thread.__init__(self)
+
+        self.scraper_class = scraper_class
+        self.num_pages = num_pages
+
+        self.linkedin_username = linkedin_username
+        self.linkedin_password = linkedin_password
+
+        # Shared input queue
+        self.items = as_queue(items)
+
+        # Output setting
+        self.output_format = output_format
+        self.output_folder = output_folder
+        self.resume = resume
+
+        self.block_resources = block_resources
+
+        # Rate limiting and backoff, shared by all pages
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+
+        # Further arguments of the scrapers
+        self.kwargs = kwargs
+
+    def run(self):
+        """
+            Run the event loop until all items are done. This function is required by the threading module.
+        """
+        asyncio.run(self.scrape())
+
+    async def scrape(self):
+        results_saver = create_results_saver(self.scraper_class,self.output_format,self.output_folder,resume=self.resume,snapshots=self.kwargs.get('snapshots', False),items=self.items,incremental=self.kwargs.get('incremental', False))
+        results_saver.start()
+
+        chrome = Chrome(self.block_resources)
+        scrapers = []
+
+        try:
+            with startup.phase('chrome'):
+                await chrome.launch()
+
+            # Login once, all pages share the cookies of the browser
+            pages = [await chrome.new_page()]
+            with startup.phase('login'):
+                await session_login(chrome, pages[0], self.linkedin_username, self.linkedin_password, self.output_folder + 'linkedin_cookies.json')
+
+            for i in range(self.num_pages - 1):
+                pages.append(await chrome.new_page())
+
+            for page in pages:
+                scrapers.append(self.scraper_class(page, self.items, results_saver, self.scheduler, output_folder=self.output_folder, **self.kwargs))
+
+            # A failing page stops, the others go on with the remaining items
+            for error in await asyncio.gather(*[scraper.scrape() for scraper in scrapers], return_exceptions=True):
+                if isinstance(error, Exception):
+                    print("Page stopped: " + type(error).__name__ + ": " + str(error))
+
+        finally:
+            for scraper in scrapers:
+                scraper.close()
+
+            await chrome.close()
+
+            results_saver.close()
+            metrics.save(self.output_folder)
+
+class AsyncPageScraper():
+    """
+        Base of the async scrapers. Runs the steps of the page logic (see Steps.py) on one page, like the selenium
+        scrapers do in their browser. Blocking calls are run in an executor, so that the other pages go on.
+    """
+
+    # One tab per page, pages are not prefetched
+    upcoming_urls = []
+
+    # cProfile would measure all pages of the event loop at once
+    profile_sample_rate = 0
+
+    async def scrape(self):
+        """
+            Scrape items from the queue until it is empty.
+        """
+
+        async for item in iterate_queue_async(self.items):
+            await run_steps_async(self.scrape_item(item), self.execute)
+
+    async def execute(self, command):
+        """
+            Run a command of the steps.
+        """
+
+        if isinstance(command, Script):
+            if command.asynchronous:
+                return await self.page.execute_async_script(command.script, *command.args)
+            return await self.page.execute_script(command.script, *command.args)
+
+        if isinstance(command, WaitFor):
+            return await self.page.wait_for_condition(command.condition, timeout=command.timeout)
+
+        if isinstance(command, Load):
+            await acquire(self.scheduler)
+            startup.report_first_request()
+            return await self.page.get(command.url)
+
+        if isinstance(command, CurrentUrl):
+            return await self.page.current_url()
+
+        if isinstance(command, Prefetch):
+            return
+
+        if isinstance(command, Sleep):
+            return await asyncio.sleep(command.seconds)
+
+        if isinstance(command, Call):
+            return await asyncio.get_event_loop().run_in_executor(None, lambda: command.function(*command.args, **command.kwargs))
+
+        raise TypeError('Unknown command ' + type(command).__name__)
+
+class AsyncHashtagScraper(AsyncPageScraper, HashtagSteps):
+    """
+        Scrape hashtags on one page, like HashtagScraper.
+    """
+
+    # Name of the output file and of the snapshot index
+    output_file = 'output_hashtags'
+    snapshot_file = 'snapshots_hashtags'
+
+    def __init__(self, page, hashtags, results_saver, scheduler, output_folder='../output/', scroll_depth=50, target_posts=None, max_idle_scrolls=3, incremental=False, known_posts_run=10, snapshots=False, harvest_every=0):
+        self.page = page
+        self.items = hashtags
+        self.results_saver = results_saver
+        self.scheduler = scheduler
+        self.output_folder = output_folder
+
+        # Scroll settings, see HashtagScraper
+        self.scroll_depth = scroll_depth
+        self.target_posts = target_posts
+        self.max_idle_scrolls = max_idle_scrolls
+
+        # Snapshot mode, see HashtagScraper
+        self.snapshots = snapshots
+
+        # Incremental mode, see HashtagScraper
+        self.post_index = PostIndex(self.output_folder + 'post_index.sqlite') if incremental else None
+        self.known_posts_run = known_posts_run
+        self.known_post_ids = set()
+
+        # Harvesting, see HashtagScraper
+        self.harvest_every = 0 if snapshots else int(harvest_every)
+        self.harvested_posts = []
+
+    def close(self):
+        if self.post_index is not None:
+            self.post_index.close()
+
+class AsyncProfileScraper(AsyncPageScraper, ProfileSteps):
+    """
+        Scrape profiles on one page, like ProfileScraper.
+    """
+
+    # Name of the output file and of the snapshot index
+    output_file = 'output_profiles'
+    snapshot_file = 'snapshots_profiles'
+
+    def __init__(self, page, profiles, results_saver, scheduler, output_folder='../output/', wait_timeout=5, company_cache_ttl=30*24*60*60, company_cache_size=10000, snapshots=False, profile_max_age=None):
+        self.page = page
+        self.items = profiles
+        self.results_saver = results_saver
+        self.scheduler = scheduler
+        self.output_folder = output_folder
+
+        # Timeout of each wait for the page in seconds
+        self.wait_timeout = wait_timeout
+
+        # Snapshot mode, see ProfileScraper
+        self.snapshots = snapshots
+
+        # Cache of company details, shared by all profiles
+        self.company_cache = CompanyCache(self.output_folder + 'company_cache.sqlite', ttl=company_cache_ttl, max_size=company_cache_size)
+
+        # Store of the last result of each profile, as in ProfileScraper
+        self.profile_max_age = profile_max_age
+        self.profile_store = ProfileStore(self.output_folder + 'profile_store.sqlite') if profile_max_age is not None and not snapshots else None
+        self.stored_profile = None
+        self.fingerprint = ''
+
+    def close(self):
+        # Report and close company cache
+        print("Company cache: " + json.dumps(self.company_cache.stats()))
+        self.company_cache.close()
+
+        if self.profile_store is not None:
+            self.profile_store.close()
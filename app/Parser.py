@@ -0,0 +1,194 @@
+from multiprocessing import Pool
+from urllib.parse import urljoin
+
+import glob
+import json
+
+from lxml import html as lxml_html
+
+from utils import *
+
+def has_class(name):
+    """
+        Helper to build an XPath condition that matches elements with the given class, like getElementsByClassName.
+    """
+    return "contains(concat(' ', normalize-space(@class), ' '), ' " + name + " ')"
+
+def inner_text(el):
+    return el.text_content().strip()
+
+# XPath of the raw fields of a post, relative to the post element. Same fields as SCRAPE_POSTS_SCRIPT.
+POST_XPATHS = {
+    'username': (".//*[" + has_class('feed-shared-actor__name') + "]", inner_text),
+    'user_url': (".//*[" + has_class('app-aware-link') + "]", lambda el: el.get('href')),
+    'userdescription': (".//*[" + has_class('feed-shared-actor__description') + "]", inner_text),
+    'published': (".//*[" + has_class('feed-shared-actor__sub-description') + "]", inner_text),
+    'text': (".//*[" + has_class('feed-shared-text') + "]", inner_text)
+}
+
+def load_tree(snapshot):
+    """
+        Parse the DOM of a snapshot. Templates are dropped, as their content is not part of the page.
+    """
+    tree = lxml_html.fromstring(snapshot.html)
+    for el in tree.xpath('//template'):
+        el.drop_tree()
+
+    return tree
+
+def first_text(tree, xpath):
+    """
+        Helper to get the text of the first match of xpath, or '' if there is none.
+    """
+    els = tree.xpath(xpath)
+    return inner_text(els[0]) if els else ''
+
+def parse_hashtag_snapshot(path):
+    """
+        Extract the posts of a hashtag feed snapshot. Returns the hashtag result and the number of failures per field.
+    """
+    snapshot = Snapshot.load(path)
+    tree = load_tree(snapshot)
+
+    raw_posts = []
+    for el in tree.xpath('//*[@data-id]'):
+        raw_post = {'data_id': el.get('data-id'), 'errors': []}
+        for field, (xpath, getter) in POST_XPATHS.items():
+            matches = el.xpath(xpath)
+            if matches:
+                raw_post[field] = getter(matches[0]) or ''
+            else:
+                raw_post[field] = ''
+                raw_post['errors'].append(field)
+        raw_posts.append(raw_post)
+
+    posts, failures = parse_raw_posts(raw_posts)
+
+    hashtag_follower = first_text(tree, "(//*[" + has_class('core-rail') + "])[1]/*[1]/*[1]/*[1]/*[2]/*[2]")
+
+    hashtag_results = HashtagScrapingResult(
+        hashtag=snapshot.item,
+        hashtag_follower=hashtag_follower,
+        scraping_date=remove_escapes(snapshot.scraping_date),
+        hashtag_posts=posts,
+        hashtag_scrolls=snapshot.metadata.get('scrolls')
+    )
+
+    return hashtag_results, failures
+
+def parse_profile_snapshot(path):
+    """
+        Extract a profile snapshot. The company details are taken from the lookups made while scraping.
+    """
+    snapshot = Snapshot.load(path)
+    tree = load_tree(snapshot)
+
+    names = tree.xpath("(//*[" + has_class('pv-top-card--list') + "])[1]/*[1]")
+    if not names:
+        raise ScrapingException('Profile name not found')
+
+    email = ''
+    for el in tree.xpath("//*[" + has_class('pv-contact-info__contact-type') + "]"):
+        if 'ci-email' in el.get('class'):
+            email = first_text(el, "./*[3]/*[1]")
+
+    skills = [first_text(el, ".//*[" + has_class('pv-skill-category-entity__name-text') + "]")
+              for el in tree.xpath("//*[" + has_class('pv-skill-category-entity') + "]")]
+
+    current_employer = first_text(tree, "(//*[" + has_class('pv-top-card--experience-list') + "])[1]/*[1]/*[1]/*[2]")
+
+    raw_jobs = []
+    for el in tree.xpath("(//*[@id='experience-section']//ul)[1]//li"):
+        if el.get('class') == 'pv-entity__position-group-role-item-fading-timeline':
+            continue
+        if el.xpath(".//*[" + has_class('pv-entity__position-group-role-item-fading-timeline') + "]"):
+            continue
+
+        info = "(.//*[" + has_class('pv-entity__summary-info') + "])[1]"
+        links = el.xpath('.//a')
+        raw_jobs.append([
+            first_text(el, info + "//h3"),
+            first_text(el, info + "//*[" + has_class('pv-entity__secondary-title') + "]"),
+            urljoin(snapshot.url, links[0].get('href', '')) if links and links[0].get('href') else '',
+            first_text(el, "((" + info + "//*[" + has_class('pv-entity__date-range') + "])[1]//span)[2]"),
+            first_text(el, "((" + info + "//*[" + has_class('pv-entity__location') + "])[1]//span)[2]")
+        ])
+
+    companies = snapshot.metadata.get('companies', {})
+    jobs = build_jobs(raw_jobs, lambda company_url: tuple(companies.get(normalize_company_url(company_url), ['', ''])))
+
+    profile = Profile(
+        name=inner_text(names[0]),
+        email=email,
+        skills=skills,
+        current_employer=current_employer,
+        jobs=jobs
+    )
+
+    profile_results = ProfileScrapingResult(
+        profile=snapshot.item,
+        scraping_date=snapshot.scraping_date,
+        profile_information=profile.as_json()
+    )
+
+    return profile_results, {}
+
+# Parse function per kind of snapshot
+PARSERS = {
+    'hashtags': parse_hashtag_snapshot,
+    'profiles': parse_profile_snapshot
+}
+
+def parse_snapshot(entry):
+    """
+        Parse a single snapshot in a worker process. Returns (path, results, failures, error).
+    """
+    kind, path = entry
+
+    try:
+        results, failures = PARSERS[kind](path)
+        return path, results, failures, None
+    except Exception as e:
+        return path, None, {}, type(e).__name__ + ': ' + str(e)
+
+def parse_snapshots(kind, output_format='json', output_folder='../output/', processes=None, resume=False):
+    """
+        Parse all snapshots of a kind (hashtags or profiles) in the output folder with a pool of processes and write
+        the results like the scrapers do. Items of the job ledger are the snapshot files.
+    """
+    if kind not in PARSERS:
+        sys.exit("Snapshot kind not specified.")
+
+    paths = sorted(glob.glob(output_folder + 'snapshots/' + kind + '/*.json.gz'))
+
+    results_saver = ResultsSaver(output_format,output_folder,output_file='output_' + kind,resume=resume)
+    results_saver.start()
+
+    try:
+        # Skip snapshots that are done in a previous run
+        entries = []
+        for path in paths:
+            if not results_saver.is_done(path):
+                results_saver.begin(path)
+                entries.append((kind, path))
+
+        failures = {}
+        with Pool(processes) as pool:
+            for path, results, item_failures, error in pool.imap_unordered(parse_snapshot, entries, chunksize=4):
+                if error is not None:
+                    results_saver.fail(path, error)
+                    continue
+
+                for field, count in item_failures.items():
+                    failures[field] = failures.get(field, 0) + count
+
+                results_saver.update(results, item=path)
+                metrics.increment('snapshots_parsed')
+
+        # Report failed fields
+        if failures:
+            print("Missing fields: " + json.dumps(failures))
+
+    finally:
+        results_saver.close()
+        metrics.save(output_folder)
@@ -1,488 +1,525 @@
-from threading import Thread
+from threading import Lock, Thread
+from queue import Queue
 from selenium import webdriver
-from selenium.common.exceptions import WebDriverException
-from datetime import datetime
 
 import time
 import json
-import hashlib
+import os
+import sys
 
-import pandas as pd
+from utils import *
+from Steps import HashtagSteps, ProfileSteps, Script, WaitFor, Load, CurrentUrl, Prefetch, Sleep, Call, run_steps
+
+# URL patterns of the resources that can be blocked, by resource type
+BLOCKED_URL_PATTERNS = {
+    'images': ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.webp', '*.svg', '*.ico', '*media.licdn.com/dms/image/*'],
+    'fonts': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'media': ['*.mp4', '*.webm', '*.m3u8', '*.m4s', '*.mp3', '*dms.licdn.com/playlist/*'],
+    'stylesheets': ['*.css']
+}
+
+# WebDriver commands that run a script, synchronously or asynchronously
+SCRIPT_COMMANDS = ['executeScript', 'w3cExecuteScript', 'executeAsyncScript', 'w3cExecuteScriptAsync']
+
+def get_blocked_url_patterns(block_resources):
+    """
+        Helper to get the URL patterns of the given resource types. Other entries are taken as URL patterns.
+    """
+    url_patterns = []
+    for resource in block_resources:
+        url_patterns += BLOCKED_URL_PATTERNS.get(resource, [resource])
+
+    return url_patterns
+
+def block_urls(browser, url_patterns):
+    """
+        Block requests by URL pattern in the current tab. Chrome applies the blocking per tab.
+    """
+    browser.execute_cdp_cmd('Network.enable', {})
+    browser.execute_cdp_cmd('Network.setBlockedURLs', {'urls': url_patterns})
+
+# Path of chromedriver, resolved once per process
+chromedriver_lock = Lock()
+chromedriver = None
+
+def get_chromedriver_path():
+    """
+        Get the path of chromedriver. A driver pinned with CHROMEDRIVER_PATH (e.g. resolved when the image is built) is
+        used as is, otherwise ChromeDriverManager looks up and possibly downloads a matching driver.
+    """
+    global chromedriver
+
+    with chromedriver_lock:
+        if chromedriver is None:
+            with startup.phase('chromedriver'):
+                if os.getenv('CHROMEDRIVER_PATH'):
+                    if not os.path.exists(os.getenv('CHROMEDRIVER_PATH')):
+                        raise FileNotFoundError("CHROMEDRIVER_PATH does not exist.")
+                    chromedriver = os.getenv('CHROMEDRIVER_PATH')
+                else:
+                    from webdriver_manager.chrome import ChromeDriverManager
+                    chromedriver = ChromeDriverManager().install()
+
+        return chromedriver
+
+def create_browser(block_resources=None):
+    """
+        Instantiate Chrome. block_resources is an optional list of resource types (see BLOCKED_URL_PATTERNS) and URL
+        patterns, which Chrome does not download.
+    """
+
+    # Options of the Chrome instance
+    options = webdriver.ChromeOptions()
+    options.add_argument('--no-sandbox')
+    options.add_argument('--headless')
+
+    executable_path = get_chromedriver_path()
+
+    if not block_resources:
+        with startup.phase('chrome'):
+            return count_commands(webdriver.Chrome(executable_path=executable_path, options=options))
+
+    # Log network events to count blocked requests. All resources are blocked by URL pattern below, as requests
+    # blocked by the content settings of Chrome would not show up in the log.
+    capabilities = options.to_capabilities()
+    capabilities['goog:loggingPrefs'] = {'performance': 'ALL'}
+
+    with startup.phase('chrome'):
+        browser = webdriver.Chrome(executable_path=executable_path, options=options, desired_capabilities=capabilities)
+
+    # Block requests by URL pattern
+    block_urls(browser, get_blocked_url_patterns(block_resources))
+
+    return count_commands(browser)
+
+def count_commands(browser):
+    """
+        Count the script calls and navigations of the browser in the metrics.
+    """
+    execute = browser.execute
+
+    def counted_execute(driver_command, params=None):
+        if driver_command in SCRIPT_COMMANDS:
+            metrics.increment('execute_script_calls')
+        elif driver_command == 'get':
+            metrics.increment('navigations')
+
+        return execute(driver_command, params)
+
+    browser.execute = counted_execute
+
+    return browser
+
+class TabPool():
+    """
+        Tabs of one browser, in which upcoming pages are loaded in the background. The scraper works in the current
+        tab, while Chrome loads up to max_tabs - 1 prefetched pages in other tabs. With max_tabs=1, pages are loaded in
+        the current tab as before. With block_resources, the requests are blocked in each background tab as in the
+        first one.
+    """
+
+    def __init__(self, browser, scheduler, max_tabs=1, block_resources=None):
+        self.browser = browser
+        self.scheduler = scheduler
+        self.max_tabs = int(max_tabs)
+        self.url_patterns = get_blocked_url_patterns(block_resources) if block_resources else None
+
+        # Window handles of the prefetched pages by url
+        self.prefetched = {}
+
+    def free_tabs(self):
+        return self.max_tabs - 1 - len(self.prefetched)
+
+    def prefetch(self, url):
+        """
+            Start loading the url in a background tab, if a tab is free. Does not wait for the page.
+        """
+        if url in self.prefetched or self.free_tabs() <= 0:
+            return
 
-from webdriver_manager.chrome import ChromeDriverManager
+        self.scheduler.acquire()
 
-from utils import *
+        if self.url_patterns is None:
+            handles = set(self.browser.window_handles)
+            self.browser.execute_script("window.open(arguments[0], '_blank');", url)
+            new_handles = [handle for handle in self.browser.window_handles if handle not in handles]
 
-class HashtagScraper(Thread):
+        else:
+            # Open a blank tab and block requests in it, before the url is loaded into it by name from this tab
+            name = 'prefetch-' + get_content_hash(url)[:10]
+            handles = set(self.browser.window_handles)
+            self.browser.execute_script("window.open('about:blank', arguments[0]);", name)
+            new_handles = [handle for handle in self.browser.window_handles if handle not in handles]
 
-    def __init__(self, linkedin_username, linkedin_password, hashtags, headless=False, scroll_depth=50, output_format='json'):
+            if new_handles:
+                current_handle = self.browser.current_window_handle
+                self.browser.switch_to.window(new_handles[0])
+                block_urls(self.browser, self.url_patterns)
+                self.browser.switch_to.window(current_handle)
 
-        # Initialize thread
-        Thread.__init__(self)
+                self.browser.execute_script("window.open(arguments[0], arguments[1]);", url, name)
 
-        # Options of the Chrome instance
-        options = webdriver.ChromeOptions()
-        options.add_argument('--no-sandbox')
-        options.add_argument('--headless')
+        if new_handles:
+            self.prefetched[url] = new_handles[0]
+            metrics.increment('navigations')
+            metrics.increment('prefetched_pages')
 
-        # Instantiate Chrome
-        self.browser = webdriver.Chrome(executable_path=ChromeDriverManager().install(), options=options)
+    def discard_except(self, urls):
+        """
+            Close the prefetched tabs of all other urls, e.g. of items that are not scraped anymore.
+        """
+        current_handle = self.browser.current_window_handle
 
-        # Make linkedin credentials available to other functions
-        self.linkedin_username = linkedin_username
-        self.linkedin_password = linkedin_password
+        for url in [url for url in self.prefetched if url not in urls]:
+            self.browser.switch_to.window(self.prefetched.pop(url))
+            self.browser.close()
 
-        # Make Hashtag urls available to other functions
-        self.hashtags = hashtags
+        self.browser.switch_to.window(current_handle)
 
-        # Scroll depth
-        self.scroll_depth = scroll_depth
+    def get(self, url):
+        """
+            Show the url in the current tab. A prefetched page replaces the current tab, otherwise the url is loaded.
+        """
+        startup.report_first_request()
 
-        # Output setting
-        self.output_format = output_format
-        self.output_folder = '../output/'
+        handle = self.prefetched.pop(url, None)
 
-    def run(self):
+        if handle is None:
+            self.scheduler.acquire()
+            self.browser.get(url)
+            return
+
+        self.browser.close()
+        self.browser.switch_to.window(handle)
+
+        wait_for_condition(self.browser, "document.readyState == 'complete'", timeout=30)
+
+    def prefetch_all(self, urls):
         """
-            Start parallel jobs. This function is required by the threading module.
+            Load the given urls in background tabs, as far as tabs are free, and close the tabs of other urls.
         """
-        
-        # Login to LinkedIn
-        linkedin_login(self.browser,self.linkedin_username,self.linkedin_password)
+        self.discard_except(urls)
 
-        # Check, if we are on the correct page. After login, we should've been redirected to the feed
-        if not self.browser.current_url == "https://www.linkedin.com/feed/":
-            time.sleep(40)
-            raise AuthenticationException()
+        for url in urls:
+            self.prefetch(url)
 
-        # Actual work: For each url, scrape posts and store data
-        results_saver = ResultsSaver(self.output_format,self.output_folder)
-        scraping_results = results_saver.initialize()
 
-        # Loop
-        for hashtag in self.hashtags:
+def create_results_saver(scraper_class, output_format, output_folder, resume=False, snapshots=False, items=None, incremental=False):
+    """
+        Create the results saver of a scraper. In snapshot mode, the scrapers write an index of their snapshots as
+        jsonl instead of the results. If the items are leased from a work queue, they are acknowledged there. In
+        incremental mode, the saved posts are added to the post index.
+    """
+    work_queue = items if isinstance(items, WorkQueue) else None
 
-            # Create hashtag url
-            hashtag_url = 'https://www.linkedin.com/feed/hashtag/?keywords=' + hashtag
- 
-            # Scrape hashtag posts of this url
-            hashtag_follower, hashtag_posts = self.scrape_hashtag_posts(hashtag_url)
+    if snapshots:
+        return ResultsSaver('jsonl',output_folder,output_file=scraper_class.snapshot_file,resume=resume,work_queue=work_queue)
 
-            # Get date of scraping
-            scraping_date = datetime.now().strftime('%Y-%m-%d %H-%M-%S')
+    post_index = PostIndex(output_folder + 'post_index.sqlite') if incremental else None
 
-            # Collect results for hashtag in data class
-            hashtag_results = HashtagScrapingResult(
-                hashtag=remove_escapes(hashtag),
-                hashtag_follower=remove_escapes(hashtag_follower),
-                scraping_date=remove_escapes(scraping_date),
-                hashtag_posts=hashtag_posts
-            )
+    return ResultsSaver(output_format,output_folder,output_file=scraper_class.output_file,resume=resume,work_queue=work_queue,post_index=post_index)
 
-            # Store results for all hashtags
-            scraping_results = results_saver.update(scraping_results, hashtag_results)
+class ScraperPool(Thread):
+    """
+        Run several scrapers of one kind in parallel. Each worker has its own Chrome instance, pulls hashtags or
+        profiles from a shared queue and hands its results to one shared results saver.
+    """
 
-            # Save to file
-            results_saver.save_to_file(scraping_results,output_file='output_hashtags')
+    def __init__(self, scraper_class, num_workers, linkedin_username, linkedin_password, items, output_format='json', output_folder='../output/', resume=False, **kwargs):
 
-        # Closing the Chrome instance
-        self.browser.quit()
+        # Initialize thread
+        Thread.__init__(self)
+
+        self.scraper_class = scraper_class
+        self.num_workers = num_workers
+
+        self.linkedin_username = linkedin_username
+        self.linkedin_password = linkedin_password
+
+        # Shared input queue
+        self.items = as_queue(items)
 
-    def scrape_hashtag_posts(self, hashtag_url, waiting_time=10):    
+        # Output setting
+        self.output_format = output_format
+        self.output_folder = output_folder
+        self.resume = resume
+
+        # Further arguments of the scrapers
+        self.kwargs = kwargs
+
+    def run(self):
         """
-            Main scraping function: Calls pageload_and_scrape() function. Or recursively itself with delay on error (e.g. when showing a captcha).
+            Start the workers and wait for them to finish. This function is required by the threading module.
         """
-        
+
+        results_saver = create_results_saver(self.scraper_class,self.output_format,self.output_folder,resume=self.resume,snapshots=self.kwargs.get('snapshots', False),items=self.items,incremental=self.kwargs.get('incremental', False))
+        results_saver.start()
+
         try:
-            # Try scrape posts
-            hashtag_posts = self.pageload_and_scrape_posts(hashtag_url)
+            # Instantiate one scraper (and Chrome) per worker
+            workers = []
+            for i in range(self.num_workers):
+                workers.append(self.scraper_class(self.linkedin_username, self.linkedin_password, self.items,
+                                                  output_format=self.output_format, output_folder=self.output_folder, results_saver=results_saver, **self.kwargs))
+
+            for worker in workers:
+                worker.start()
 
-        except HumanCheckException:
-            # If Human Check Exception occurs, wait ...
-            time.sleep(waiting_time)
+            for worker in workers:
+                worker.join()
 
-            # and call this function again
-            hashtag_posts = self.scrape_hashtag_posts(hashtag_url, int(waiting_time*1.5))
+        finally:
+            results_saver.close()
+            metrics.save(self.output_folder)
 
-        except ScrapingException:
-            # If Scraping Exception, return with None
-            hashtag_posts = None
+class WebDriverScraper(Thread):
+    """
+        Base of the selenium scrapers. Runs the steps of the page logic (see Steps.py) through WebDriver in the current
+        tab of the browser, while the next items are loaded in background tabs.
+    """
 
-        return hashtag_posts
+    def run_steps(self, steps):
 
-    def pageload_and_scrape_posts(self, hashtag_url):
+        return run_steps(steps, self.execute)
+
+    def execute(self, command):
         """
-            Main function that will load the full page (to a certain extend) by "scrolling" down and scrape all posts that have been loaded.
+            Run a command of the steps.
         """
-        # Check, if the current url is valid (syntax)
-        if not is_url_valid(hashtag_url):
-            raise ScrapingException
 
-        # Load the url
-        self.browser.get(hashtag_url)
+        if isinstance(command, Script):
+            if command.asynchronous:
+                return self.browser.execute_async_script(command.script, *command.args)
+            return self.browser.execute_script(command.script, *command.args)
 
-        # Check correct loading of page and eventual Human Check
-        if not str(self.browser.current_url).strip() == hashtag_url.strip():
-            if self.browser.current_url == 'https://www.linkedin.com/in/unavailable/':
-                raise ScrapingException
-            else:
-                raise HumanCheckException
+        if isinstance(command, WaitFor):
+            return wait_for_condition(self.browser, command.condition, timeout=command.timeout)
 
-        # Scroll down to see more posts
-        self.load_full_page()
+        if isinstance(command, Load):
+            return self.tab_pool.get(command.url)
 
-        # Scrape posts
-        posts = self.scrape_posts()
-        followers = self.scrape_hashtag_followers()
+        if isinstance(command, CurrentUrl):
+            return self.browser.current_url
 
-        return followers, posts
+        if isinstance(command, Prefetch):
+            if command.discard_others:
+                return self.tab_pool.prefetch_all(command.urls)
 
-    def scrape_posts(self):
-        """
-            Scrape each post from the loaded hastag feed.
-        """
-        
-        # Get number of posts (depending on scroll-depth)
-        num_posts = self.browser.execute_script("return document.querySelectorAll('[data-id]').length")
-        
-        # Initialize dict
-        posts = {}
+            for url in command.urls:
+                self.tab_pool.prefetch(url)
+            return
 
-        for i in range(0,num_posts):
-            try:
-                # Get id of post
-                data_id = self.browser.execute_script("return document.querySelectorAll('[data-id]')[" + str(i) + "].getAttribute('data-id')")
-                
-                # Get user name of post
-                post_username = self.browser.execute_script("return document.querySelectorAll('[data-id]')[" + str(i) + "].getElementsByClassName('feed-shared-actor__name')[0].innerText")
-
-                # Get user id
-                post_userprofileid =  get_userprofileid_from_userurl(self.browser.execute_script("return document.querySelectorAll('[data-id]')[" + str(i) + "].getElementsByClassName('app-aware-link')[0].href"))
-
-                # Get user description of post
-                post_userdescription = self.browser.execute_script("return document.querySelectorAll('[data-id]')[" + str(i) + "].getElementsByClassName('feed-shared-actor__description')[0].innerText")
-
-                # Get time of post
-                post_published = self.browser.execute_script("return document.querySelectorAll('[data-id]')[" + str(i) + "].getElementsByClassName('feed-shared-actor__sub-description')[0].innerText")
-
-                # Get text of post
-                post_text = self.browser.execute_script("return document.querySelectorAll('[data-id]')[" + str(i) + "].getElementsByClassName('feed-shared-text')[0].innerText")
-                
-                # Create hash from data_id and use it as id
-                post_id = hashlib.sha1(bytes(data_id, encoding='utf-8')).hexdigest()
-
-                # Create post object
-                post = Post(username=remove_escapes(post_username),
-                            user_profile_id=post_userprofileid,
-                            userdescription=remove_escapes(post_userdescription),
-                            published=remove_escapes(post_published),
-                            text=remove_escapes(post_text),
-                            data_id = data_id
-                        )
-                
-                # Convert to json
-                posts[post_id] = post.as_json()
-  
-            except:
-                pass
-
-        return posts
-    
-    def scrape_hashtag_followers(self):
-        """
-            Scrape number of hashtag followers.
-        """
-        
-        hashtag_follower = self.browser.execute_script("return document.getElementsByClassName('core-rail')[0].children[0].children[0].children[0].children[1].children[1].innerText")
+        if isinstance(command, Sleep):
+            return time.sleep(command.seconds)
+
+        if isinstance(command, Call):
+            return command.function(*command.args, **command.kwargs)
 
-        return hashtag_follower
+        raise TypeError('Unknown command ' + type(command).__name__)
 
-    def load_full_page(self):
+    def scrape_items(self, items, get_url, lookahead):
         """
-            Load the full page by imitating a "scrolling".
+            Scrape all items and hand the results to the results saver. The next lookahead items are loaded in the
+            background, get_url gives their urls.
         """
 
-        window_height = self.browser.execute_script("return window.innerHeight")
-        
-        scrolls = 1
-        while scrolls * window_height < self.browser.execute_script("return document.body.offsetHeight"):
-            
-            self.browser.execute_script('window.scrollTo(0, ' + str(window_height * scrolls) + ');')
-           
-            wait_for_scrolling()
-           
-            scrolls += 1
+        for item, upcoming in iterate_queue_with_lookahead(items, lookahead):
 
-            # DEBUG: Manual break loop (for dev)
-            if scrolls > int(self.scroll_depth):
-                break
+            # Pages to load in the background
+            self.upcoming_urls = [get_url(i) for i in upcoming if self.is_pending(i)]
 
-class ProfileScraper(Thread):
+            scraped = self.run_steps(self.scrape_item(item))
 
-    def __init__(self, linkedin_username, linkedin_password, profiles, headless=False, output_format='json'):
+            # Report blocked resources of this item
+            if scraped and self.block_resources:
+                print(remove_escapes(item) + ": " + json.dumps(network_stats(self.browser)))
+
+class HashtagScraper(WebDriverScraper, HashtagSteps):
+
+    # Name of the output file and of the snapshot index
+    output_file = 'output_hashtags'
+    snapshot_file = 'snapshots_hashtags'
+
+    def __init__(self, linkedin_username, linkedin_password, hashtags, headless=False, scroll_depth=50, output_format='json', output_folder='../output/', results_saver=None, resume=False, block_resources=None, profile_sample_rate=0, scheduler=None, target_posts=None, max_idle_scrolls=3, incremental=False, known_posts_run=10, snapshots=False, tabs=1, harvest_every=0):
 
         # Initialize thread
         Thread.__init__(self)
 
-        # Options of the Chrome instance
-        options = webdriver.ChromeOptions()
-        options.add_argument('--no-sandbox')
-        options.add_argument('--headless')
-
         # Instantiate Chrome
-        self.browser = webdriver.Chrome(executable_path=ChromeDriverManager().install(), options=options)
+        self.browser = create_browser(block_resources)
+        self.block_resources = block_resources
 
         # Make linkedin credentials available to other functions
         self.linkedin_username = linkedin_username
         self.linkedin_password = linkedin_password
 
         # Make Hashtag urls available to other functions
-        self.profiles = profiles
+        self.hashtags = as_queue(hashtags)
+
+        # Scroll depth
+        self.scroll_depth = scroll_depth
+
+        # Optional number of posts per hashtag, after which scrolling stops. Scrolling also stops, if max_idle_scrolls
+        # scrolls in a row did not load new posts.
+        self.target_posts = target_posts
+        self.max_idle_scrolls = max_idle_scrolls
 
         # Output setting
         self.output_format = output_format
-        self.output_folder = '../output/'
+        self.output_folder = output_folder
+        self.results_saver = results_saver
+        self.resume = resume
+
+        # Snapshot mode: Save the expanded pages and leave the extraction to the parse stage (see Parser.py)
+        self.snapshots = snapshots
+
+        # Share of items that are run under cProfile
+        self.profile_sample_rate = float(profile_sample_rate)
+
+        # Rate limiting and backoff, shared with the other scrapers of a pool
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
+
+        # Tabs of the browser, the next items are loaded in background tabs
+        self.tab_pool = TabPool(self.browser, self.scheduler, max_tabs=tabs, block_resources=block_resources)
+        self.upcoming_urls = []
+
+        # Incremental mode: Index of posts seen in earlier runs. Scrolling stops after known_posts_run known posts in a
+        # row and only new posts are saved. The results saver adds the posts to the index, once they are saved.
+        self.post_index = PostIndex(self.output_folder + 'post_index.sqlite') if incremental else None
+        self.known_posts_run = known_posts_run
+        self.known_post_ids = set()
+
+        # Harvesting: Every harvest_every scrolls, the loaded posts are extracted and removed from the page, so that
+        # the memory of the browser does not grow with the scroll depth. Not in snapshot mode, which needs the posts.
+        self.harvest_every = 0 if snapshots else int(harvest_every)
+        self.harvested_posts = []
 
     def run(self):
         """
             Start parallel jobs. This function is required by the threading module.
         """
         
-        # Login to LinkedIn
-        linkedin_login(self.browser,self.linkedin_username,self.linkedin_password)
-
-        # Check, if we are on the correct page. After login, we should've been redirected to the feed
-        if not self.browser.current_url == "https://www.linkedin.com/feed/":
-            time.sleep(40)
-            raise AuthenticationException()
-
-        # Actual work: For each url, scrape posts and store data
-        results_saver = ResultsSaver(self.output_format,self.output_folder)
-        scraping_results = results_saver.initialize()
-
-        # Loop
-        for profile in self.profiles:
-
-            # Create profile url
-            profile_url = 'https://www.linkedin.com/in/' + remove_escapes(profile) + '/'
-            
-            # Scrape profile
-            profile_information = self.scrape_profile(profile_url)
-            
-            # Get date of scraping
-            scraping_date = datetime.now().strftime('%Y-%m-%d %H-%M-%S')
-
-            # Collect results for hashtag in data class
-            profile_results = ProfileScrapingResult(
-                profile=remove_escapes(profile),
-                scraping_date=scraping_date,
-                profile_information=profile_information.as_json()
-            )
-            
-            # Store profile results by adding them to scraping results
-            scraping_results = results_saver.update(scraping_results, profile_results)
-
-            # Save to file
-            results_saver.save_to_file(scraping_results,output_file='output_profiles')
+        # Login to LinkedIn, reusing the stored session if it is still valid
+        with startup.phase('login'):
+            linkedin_session_login(self.browser,self.linkedin_username,self.linkedin_password,self.output_folder + 'linkedin_cookies.json')
+
+        # Actual work: For each url, scrape posts and store data. Use the shared results saver of a pool, if given.
+        if self.results_saver is not None:
+            self.scrape_hashtags()
+        else:
+            self.results_saver = create_results_saver(type(self),self.output_format,self.output_folder,resume=self.resume,snapshots=self.snapshots,items=self.hashtags,incremental=self.post_index is not None)
+            self.results_saver.start()
+
+            try:
+                self.scrape_hashtags()
+            finally:
+                self.results_saver.close()
+                metrics.save(self.output_folder)
+
+        if self.post_index is not None:
+            self.post_index.close()
 
         # Closing the Chrome instance
         self.browser.quit()
 
-    def scrape_profile(self, linkedin_url, waiting_time=10):
-
-        try:
-            profile = self.__scrape_profile(linkedin_url)
+    def scrape_hashtags(self):
+        """
+            Scrape all hashtags, taking as many hashtags in advance as there are background tabs.
+        """
 
-        except HumanCheckException:
-            print("Please solve the captcha.")
-            print("Another try will be performed within 10 seconds...")
-            time.sleep(waiting_time)
+        self.scrape_items(self.hashtags, self.get_hashtag_url, self.tab_pool.max_tabs - 1)
 
-            profile = self.scrape_profile(linkedin_url, int(waiting_time*1.5))
+class ProfileScraper(WebDriverScraper, ProfileSteps):
 
-        except ScrapingException:
-            profile = None
+    # Name of the output file and of the snapshot index
+    output_file = 'output_profiles'
+    snapshot_file = 'snapshots_profiles'
 
-        return profile
+    def __init__(self, linkedin_username, linkedin_password, profiles, headless=False, output_format='json', output_folder='../output/', results_saver=None, resume=False, block_resources=None, profile_sample_rate=0, scheduler=None, wait_timeout=5, company_cache_ttl=30*24*60*60, company_cache_size=10000, snapshots=False, tabs=1, profile_max_age=None):
 
-    def __scrape_profile(self, profile_linkedin_url):
+        # Initialize thread
+        Thread.__init__(self)
 
-        if not is_url_valid(profile_linkedin_url):
-            raise ScrapingException
+        # Instantiate Chrome
+        self.browser = create_browser(block_resources)
+        self.block_resources = block_resources
 
-        self.browser.get(profile_linkedin_url)
+        # Make linkedin credentials available to other functions
+        self.linkedin_username = linkedin_username
+        self.linkedin_password = linkedin_password
 
-        # Check correct loading of profile and eventual Human Check
-        if not str(self.browser.current_url).strip() == profile_linkedin_url.strip():
-            if self.browser.current_url == 'https://www.linkedin.com/in/unavailable/':
-                raise ScrapingException
-            else:
-                raise HumanCheckException
-        
-        self.load_full_page()
+        # Make Hashtag urls available to other functions
+        self.profiles = as_queue(profiles)
 
-        # SCRAPING
-        profile_name = self.scrape_profile_name()
-        email = self.scrape_email()
-        skills = self.scrape_skills()
-        # - As not all of the profiles have a top card item, try catch error
-        try:
-            current_employer = self.scrape_top_card_experience_list_first_item()
-        except:
-            current_employer = ""
-            pass
-        jobs = self.scrape_jobs()  # keep as last scraping
-
-        return Profile(
-            name=profile_name,
-            email=email,
-            skills=skills,
-            current_employer = current_employer,
-            jobs=jobs
-        )
-
-    def scrape_profile_name(self):
-        return self.browser.execute_script(
-            "return document.getElementsByClassName('pv-top-card--list')[0].children[0].innerText")
-
-    def scrape_top_card_experience_list_first_item(self):
-        return self.browser.execute_script(
-            "return document.getElementsByClassName('pv-top-card--experience-list')[0].children[0].children[0].children[1].innerText")
-
-    def scrape_email(self):
-        # > click on 'Contact info' link on the page
-        self.browser.execute_script(
-            "(function(){try{for(i in document.getElementsByTagName('a')){let el = document.getElementsByTagName("
-            "'a')[i]; if(el.innerHTML.includes('Contact info')){el.click();}}}catch(e){}})()")
-        wait_for_loading()
-
-        # > gets email from the 'Contact info' popup
-        try:
-            email = self.browser.execute_script(
-                "return (function(){try{for (i in document.getElementsByClassName('pv-contact-info__contact-type')){ "
-                "let el = document.getElementsByClassName('pv-contact-info__contact-type')[i]; if("
-                "el.className.includes( 'ci-email')){ return el.children[2].children[0].innerText; } }} catch(e){"
-                "return '';}})()")
-        except WebDriverException:
-            email = ''
+        # Output setting
+        self.output_format = output_format
+        self.output_folder = output_folder
+        self.results_saver = results_saver
+        self.resume = resume
 
-        try:
-            self.browser.execute_script("document.getElementsByClassName('artdeco-modal__dismiss')[0].click()")
-        except WebDriverException:
-            pass
+        # Snapshot mode: Save the expanded pages and leave the extraction to the parse stage (see Parser.py)
+        self.snapshots = snapshots
 
-        return email
+        # Share of items that are run under cProfile
+        self.profile_sample_rate = float(profile_sample_rate)
 
-    def scrape_jobs(self):
+        # Rate limiting and backoff, shared with the other scrapers of a pool
+        self.scheduler = scheduler if scheduler is not None else Scheduler()
 
-        try:
-            jobs = self.browser.execute_script(
-                "return (function(){ var jobs = []; var els = document.getElementById("
-                "'experience-section').getElementsByTagName('ul')[0].getElementsByTagName('li'); for (var i=0; "
-                "i<els.length; i++){   if(els[i].className!='pv-entity__position-group-role-item-fading-timeline'){   "
-                "  if(els[i].getElementsByClassName('pv-entity__position-group-role-item-fading-timeline').length>0){ "
-                "     } else {       try {         position = els[i].getElementsByClassName("
-                "'pv-entity__summary-info')[0].getElementsByTagName('h3')[0].innerText;       }       catch(err) { "
-                "position = ''; }        try {         company_name = els[i].getElementsByClassName("
-                "'pv-entity__summary-info')[0].getElementsByClassName('pv-entity__secondary-title')[0].innerText;     "
-                "  } catch (err) { company_name = ''; }        try{         date_ranges = els["
-                "i].getElementsByClassName('pv-entity__summary-info')[0].getElementsByClassName("
-                "'pv-entity__date-range')[0].getElementsByTagName('span')[1].innerText;       } catch (err) {"
-                "date_ranges = ''; }        try{         job_location = els[i].getElementsByClassName("
-                "'pv-entity__summary-info')[0].getElementsByClassName('pv-entity__location')[0].getElementsByTagName("
-                "'span')[1].innerText;       } catch (err) {job_location = ''; }        try{         company_url = "
-                "els[i].getElementsByTagName('a')[0].href;       } catch (err) {company_url = ''; }        jobs.push("
-                "[position, company_name, company_url, date_ranges, job_location]);     }   } } return jobs; })();")
-        except WebDriverException:
-            jobs = []
-            
-        clean_jobs = []
-        for job in jobs: 
-            if job[2] != '':
-                clean_jobs.append(job)
-                
-        parsed_jobs = []
-        for job in clean_jobs:
-            company_industry, company_employees = self.scrape_company_details(job[2])
-
-            # Get company information
-            cmp_obj = Company(
-                name=job[1],
-                industry=company_industry,
-                employees=company_employees
-            )
-            cmp_dict = cmp_obj.reprJSON()
-            
-            # Get location information
-            loc_obj = location=Location(job[4])
-            loc_dict = loc_obj.reprJSON()
-            
-            # Combine to job object
-            job_obj = Job(position=job[0],
-                company=cmp_dict,
-                location=loc_dict,
-                date_range=job[3]
-            )
-            job_dict = job_obj.reprJSON()
-
-            # Update list
-            parsed_jobs.append(job_dict)
-
-        return parsed_jobs
-
-    def scrape_company_details(self, company_url):
-
-        self.browser.get(company_url)
+        # Tabs of the browser, the next items are loaded in background tabs
+        self.tab_pool = TabPool(self.browser, self.scheduler, max_tabs=tabs, block_resources=block_resources)
+        self.upcoming_urls = []
 
-        try:
-            company_employees = self.browser.execute_script(
-                "return document.querySelector('a[data-control-name" +
-                '="topcard_see_all_employees"' +
-                "]').innerText.split(' employees')[0].split(' ').lastObject;"
-            )
-        except WebDriverException:
-            company_employees = ''
+        # Timeout of each wait for the page in seconds. The whole profile script may take several of them.
+        self.wait_timeout = wait_timeout
+        self.browser.set_script_timeout(300)
 
-        try:
-            company_industry = self.browser.execute_script(
-                "return document.getElementsByClassName('org-top-card-summary-info-list__info-item')[0].innerText")
-        except WebDriverException:
-            company_industry = ''
+        # Cache of company details, shared by all profiles
+        self.company_cache = CompanyCache(self.output_folder + 'company_cache.sqlite', ttl=company_cache_ttl, max_size=company_cache_size)
 
-        return company_industry, company_employees
+        # Store of the last result of each profile. Profiles scraped less than profile_max_age seconds ago are not
+        # scraped again, older ones are only expanded again if their page has changed.
+        self.profile_max_age = profile_max_age
+        self.profile_store = ProfileStore(self.output_folder + 'profile_store.sqlite') if profile_max_age is not None and not snapshots else None
+        self.stored_profile = None
+        self.fingerprint = ''
 
-    def scrape_skills(self):
-        try:
-            self.browser.execute_script(
-                "document.getElementsByClassName('pv-skills-section__additional-skills')[0].click()")
-        except WebDriverException:
-            return []
+    def run(self):
+        """
+            Start parallel jobs. This function is required by the threading module.
+        """
+        
+        # Login to LinkedIn, reusing the stored session if it is still valid
+        with startup.phase('login'):
+            linkedin_session_login(self.browser,self.linkedin_username,self.linkedin_password,self.output_folder + 'linkedin_cookies.json')
 
-        wait_for_loading()
+        # Actual work: For each url, scrape posts and store data. Use the shared results saver of a pool, if given.
+        if self.results_saver is not None:
+            self.scrape_profiles()
+        else:
+            self.results_saver = create_results_saver(type(self),self.output_format,self.output_folder,resume=self.resume,snapshots=self.snapshots,items=self.profiles)
+            self.results_saver.start()
 
-        try:
-            return self.browser.execute_script(
-                "return (function(){els = document.getElementsByClassName('pv-skill-category-entity');results = ["
-                "];for (var i=0; i < els.length; i++){results.push(els[i].getElementsByClassName("
-                "'pv-skill-category-entity__name-text')[0].innerText);}return results;})()")
-        except WebDriverException:
-            return []
-
-    def load_full_page(self):
-        window_height = self.browser.execute_script("return window.innerHeight")
-        scrolls = 1
-        while scrolls * window_height < self.browser.execute_script("return document.body.offsetHeight"):
-            self.browser.execute_script('window.scrollTo(0, ' + str(window_height * scrolls) + ');')
-            wait_for_scrolling()
-            scrolls += 1
-
-        for i in range(self.browser.execute_script(
-                "return document.getElementsByClassName('pv-profile-section__see-more-inline').length")):
             try:
-                self.browser.execute_script(
-                    "document.getElementsByClassName('pv-profile-section__see-more-inline')[" + str(
-                        i) + "].click()")
-            except WebDriverException:
-                pass
+                self.scrape_profiles()
+            finally:
+                self.results_saver.close()
+                metrics.save(self.output_folder)
+
+        # Report and close company cache
+        print("Company cache: " + json.dumps(self.company_cache.stats()))
+        self.company_cache.close()
+
+        if self.profile_store is not None:
+            self.profile_store.close()
+
+        # Closing the Chrome instance
+        self.browser.quit()
+
+    def scrape_profiles(self):
+        """
+            Scrape all profiles, taking the next profile in advance, if there are background tabs. The other tabs are
+            left for the company pages.
+        """
 
-            wait_for_loading()
\ No newline at end of file
+        self.scrape_items(self.profiles, self.get_profile_url, min(1, self.tab_pool.max_tabs - 1))
@@ -0,0 +1,747 @@
+from datetime import datetime
+
+import json
+import time
+
+from utils import *
+
+# Script to count the distinct posts in the feed
+COUNT_POSTS_SCRIPT = "return new Set(Array.from(document.querySelectorAll('[data-id]')).map(function(el){ return el.getAttribute('data-id'); })).size"
+
+# Script to collect the data ids of the posts in the feed, starting at the index given as argument
+COLLECT_DATA_IDS_SCRIPT = "return Array.from(document.querySelectorAll('[data-id]')).slice(arguments[0]).map(function(el){ return el.getAttribute('data-id'); })"
+
+# Script to extract the raw fields of all posts in the feed. Each field is read separately, so that a missing
+# element is reported by its field name instead of dropping the whole extraction. If the first argument is true, only
+# posts that have not been harvested yet are extracted and then hollowed out: Their content is removed, but their
+# height is kept, so that the scroll position and the loading of further posts do not change.
+SCRAPE_POSTS_SCRIPT = """
+    var harvest = arguments[0] === true;
+    var fields = {
+        username: function(el){ return el.getElementsByClassName('feed-shared-actor__name')[0].innerText; },
+        user_url: function(el){ return el.getElementsByClassName('app-aware-link')[0].href; },
+        userdescription: function(el){ return el.getElementsByClassName('feed-shared-actor__description')[0].innerText; },
+        published: function(el){ return el.getElementsByClassName('feed-shared-actor__sub-description')[0].innerText; },
+        text: function(el){ return el.getElementsByClassName('feed-shared-text')[0].innerText; }
+    };
+    var posts = [];
+    var els = document.querySelectorAll(harvest ? '[data-id]:not([data-harvested])' : '[data-id]');
+    for (var i = 0; i < els.length; i++) {
+        var post = {data_id: els[i].getAttribute('data-id'), errors: []};
+        for (var name in fields) {
+            try { post[name] = fields[name](els[i]); }
+            catch (e) { post[name] = ''; post.errors.push(name); }
+        }
+        posts.push(post);
+    }
+    if (harvest) {
+        // Read all heights before changing the page, to lay it out only once
+        var heights = Array.from(els).map(function(el){ return el.offsetHeight; });
+        for (var i = 0; i < els.length; i++) {
+            els[i].style.height = heights[i] + 'px';
+            els[i].innerHTML = '';
+            els[i].setAttribute('data-harvested', '1');
+        }
+    }
+    return posts;
+"""
+
+# Script to get the DOM of the page for a snapshot
+SNAPSHOT_SCRIPT = "return document.documentElement.outerHTML"
+
+# Script to get the follower text of a hashtag
+HASHTAG_FOLLOWERS_SCRIPT = "return document.getElementsByClassName('core-rail')[0].children[0].children[0].children[0].children[1].children[1].innerText"
+
+# Script to expand and extract a whole profile. It is run asynchronously, so that it can wait for the page in the
+# browser instead of a round trip per step. The first argument is the timeout of each wait in milliseconds. Returns the
+# profile, the raw jobs [position, company_name, company_url, date_range, location] and the duration of each phase. If
+# the second argument is true, the contact info stays open and the DOM of the expanded page is returned as well. If the
+# third argument is not null, the fingerprint of the page is returned too, a hash of the text of the top card and the
+# experience section before they are expanded, like get_content_hash. If it equals the third argument, the script stops
+# before expanding the profile and returns {unchanged: true}.
+SCRAPE_PROFILE_SCRIPT = """
+    var done = arguments[arguments.length - 1];
+    var timeout = arguments[0];
+    var snapshot = arguments[1];
+    var storedFingerprint = arguments[2];
+
+    function sleep(ms) { return new Promise(function(resolve) { setTimeout(resolve, ms); }); }
+
+    async function waitFor(condition, ms) {
+        var end = Date.now() + (ms === undefined ? timeout : ms);
+        while (Date.now() < end) {
+            try { if (condition()) return true; } catch (e) {}
+            await sleep(100);
+        }
+        return false;
+    }
+
+    function numNodes() { return document.getElementsByTagName('*').length; }
+
+    async function clickAndWait(el) {
+        var n = numNodes();
+        el.click();
+        await waitFor(function() { return numNodes() != n; });
+    }
+
+    function text(getter) {
+        try { return getter(); } catch (e) { return ''; }
+    }
+
+    async function loadFullPage() {
+        // Scroll down a window at a time. At the bottom, wait briefly for lazy sections and stop, once the page does
+        // not grow anymore.
+        var windowHeight = window.innerHeight;
+        var height = document.body.offsetHeight;
+        for (var scrolls = 1; scrolls * windowHeight < height; scrolls++) {
+            window.scrollTo(0, windowHeight * scrolls);
+            if (window.scrollY + windowHeight < height) continue;
+
+            if (!await waitFor(function() { return document.body.offsetHeight > height; }, Math.min(timeout, 1000))) break;
+            height = document.body.offsetHeight;
+        }
+    }
+
+    async function getFingerprint() {
+        var topCard = document.getElementsByClassName('pv-top-card--list')[0];
+        var experience = document.getElementById('experience-section');
+        if (!topCard || !experience || !window.crypto || !crypto.subtle) return '';
+
+        var digest = await crypto.subtle.digest('SHA-1', new TextEncoder().encode(topCard.innerText + '\\n' + experience.innerText));
+        return Array.from(new Uint8Array(digest)).map(function(b) { return ('0' + b.toString(16)).slice(-2); }).join('');
+    }
+
+    async function expandSections() {
+        var buttons = Array.from(document.getElementsByClassName('pv-profile-section__see-more-inline'));
+        for (var i = 0; i < buttons.length; i++) {
+            try { await clickAndWait(buttons[i]); } catch (e) {}
+        }
+    }
+
+    async function scrapeEmail() {
+        var links = Array.from(document.getElementsByTagName('a'));
+        for (var i = 0; i < links.length; i++) {
+            if (links[i].innerHTML.includes('Contact info')) { links[i].click(); }
+        }
+        await waitFor(function() { return document.getElementsByClassName('pv-contact-info__contact-type').length > 0; });
+
+        var email = '';
+        var els = Array.from(document.getElementsByClassName('pv-contact-info__contact-type'));
+        for (var i = 0; i < els.length; i++) {
+            if (els[i].className.includes('ci-email')) { email = text(function() { return els[i].children[2].children[0].innerText; }); }
+        }
+
+        if (!snapshot) {
+            try { document.getElementsByClassName('artdeco-modal__dismiss')[0].click(); } catch (e) {}
+        }
+
+        return email;
+    }
+
+    async function scrapeSkills() {
+        var button = document.getElementsByClassName('pv-skills-section__additional-skills')[0];
+        if (!button) return [];
+
+        await clickAndWait(button);
+
+        return Array.from(document.getElementsByClassName('pv-skill-category-entity')).map(function(el) {
+            return text(function() { return el.getElementsByClassName('pv-skill-category-entity__name-text')[0].innerText; });
+        });
+    }
+
+    function scrapeJobs() {
+        var jobs = [];
+        var els = document.getElementById('experience-section').getElementsByTagName('ul')[0].getElementsByTagName('li');
+        for (var i = 0; i < els.length; i++) {
+            var el = els[i];
+            if (el.className == 'pv-entity__position-group-role-item-fading-timeline') continue;
+            if (el.getElementsByClassName('pv-entity__position-group-role-item-fading-timeline').length > 0) continue;
+
+            var info = function() { return el.getElementsByClassName('pv-entity__summary-info')[0]; };
+            jobs.push([
+                text(function() { return info().getElementsByTagName('h3')[0].innerText; }),
+                text(function() { return info().getElementsByClassName('pv-entity__secondary-title')[0].innerText; }),
+                text(function() { return el.getElementsByTagName('a')[0].href; }),
+                text(function() { return info().getElementsByClassName('pv-entity__date-range')[0].getElementsByTagName('span')[1].innerText; }),
+                text(function() { return info().getElementsByClassName('pv-entity__location')[0].getElementsByTagName('span')[1].innerText; })
+            ]);
+        }
+        return jobs;
+    }
+
+    (async function() {
+        var timings = {};
+        async function timed(phase, step) {
+            var start = performance.now();
+            var result = await step();
+            timings[phase] = performance.now() - start;
+            return result;
+        }
+
+        try {
+            await timed('load_full_page', loadFullPage);
+
+            // Stop before expanding the profile, if its page has not changed since the stored result
+            var fingerprint = '';
+            if (storedFingerprint !== null) {
+                fingerprint = await timed('fingerprint', getFingerprint);
+                if (fingerprint && fingerprint == storedFingerprint) {
+                    done({unchanged: true, fingerprint: fingerprint, timings: timings});
+                    return;
+                }
+            }
+
+            await timed('expand_sections', expandSections);
+
+            var name = document.getElementsByClassName('pv-top-card--list')[0].children[0].innerText;
+            var email = await timed('email', scrapeEmail);
+            var skills = await timed('skills', scrapeSkills);
+            var currentEmployer = text(function() {
+                return document.getElementsByClassName('pv-top-card--experience-list')[0].children[0].children[0].children[1].innerText;
+            });
+            var jobs = [];
+            try { jobs = scrapeJobs(); } catch (e) {}
+
+            var html = snapshot ? document.documentElement.outerHTML : null;
+
+            done({name: name, email: email, skills: skills, current_employer: currentEmployer, jobs: jobs, timings: timings, html: html, fingerprint: fingerprint});
+        } catch (e) {
+            done({error: String(e)});
+        }
+    })();
+"""
+
+# Script to get the industry and the number of employees of a company page. Missing elements give ''.
+COMPANY_DETAILS_SCRIPT = """
+    function text(getter) {
+        try { return getter(); } catch (e) { return ''; }
+    }
+
+    return [
+        text(function() { return document.getElementsByClassName('org-top-card-summary-info-list__info-item')[0].innerText; }),
+        text(function() { return document.querySelector('a[data-control-name="topcard_see_all_employees"]').innerText.split(' employees')[0].split(' ').lastObject; })
+    ];
+"""
+
+# Commands of the steps, which the engines run in the browser or for the browser
+
+class Script():
+    """
+        Run a script like WebDriver does, as function body with args as arguments. An asynchronous script gets a
+        callback for its result as last argument.
+    """
+
+    def __init__(self, script, *args, asynchronous=False):
+        self.script = script
+        self.args = args
+        self.asynchronous = asynchronous
+
+class WaitFor():
+    """
+        Wait until the javascript expression condition is true, but at most timeout seconds. Results in True, if the
+        condition has been met.
+    """
+
+    def __init__(self, condition, timeout=5):
+        self.condition = condition
+        self.timeout = timeout
+
+class Load():
+    """
+        Load the url in the current page, counted against the rate limit.
+    """
+
+    def __init__(self, url):
+        self.url = url
+
+class CurrentUrl():
+    """
+        Get the url of the current page.
+    """
+
+class Prefetch():
+    """
+        Load the urls in the background, if the engine has background tabs. With discard_others, pages prefetched for
+        other urls are discarded.
+    """
+
+    def __init__(self, urls, discard_others=False):
+        self.urls = urls
+        self.discard_others = discard_others
+
+class Sleep():
+    """
+        Wait for the given number of seconds.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+class Call():
+    """
+        Call a function that might block, e.g. of a sqlite store or the results saver. The cdp engine runs it in an
+        executor, so that the other pages go on in the meantime.
+    """
+
+    def __init__(self, function, *args, **kwargs):
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+
+def run_steps(steps, execute):
+    """
+        Run steps synchronously: Each command is run by execute and its result is sent back to the steps, or its
+        exception is raised in them. Returns the result of the steps.
+    """
+    result, error = None, None
+    while True:
+        try:
+            command = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        try:
+            result, error = execute(command), None
+        except Exception as e:
+            result, error = None, e
+
+async def run_steps_async(steps, execute):
+    """
+        Run steps like run_steps, but with a coroutine execute, from an event loop.
+    """
+    result, error = None, None
+    while True:
+        try:
+            command = steps.throw(error) if error is not None else steps.send(result)
+        except StopIteration as stop:
+            return stop.value
+
+        try:
+            result, error = await execute(command), None
+        except Exception as e:
+            result, error = None, e
+
+class Steps():
+    """
+        Page logic of the scrapers, shared by the selenium engine (Scraper.py) and the cdp engine (AsyncScraper.py).
+        The steps are generators: They yield commands (Script, Load, Call, ...) and get their results sent back, so
+        that each engine runs them its own way, through WebDriver in a thread or awaited on an event loop.
+
+        The scrapers set the settings as attributes: results_saver, scheduler, output_folder, snapshots,
+        profile_sample_rate and upcoming_urls, the urls of the next items to prefetch.
+    """
+
+    # Kind of the items, as name of their metrics
+    item_kind = None
+
+    def scrape_item(self, item):
+        """
+            Steps to scrape an item of the queue and hand its results to the results saver. Returns False, if the item
+            has been skipped, as it is done in a previous run.
+        """
+
+        # Skip items that are done in a previous run
+        if (yield Call(self.results_saver.is_done, remove_escapes(item))):
+            return False
+
+        yield Call(self.results_saver.begin, remove_escapes(item))
+
+        try:
+            with metrics.timer(self.item_kind), sample_profile(self.profile_sample_rate, self.output_folder, remove_escapes(item)):
+                yield from self.scrape_single_item(item)
+
+        except ScrapingException as e:
+            yield Call(self.results_saver.fail, remove_escapes(item), 'ScrapingException: ' + str(e))
+
+        except Exception as e:
+            # Record the error, but stop this scraper, as the browser might be broken
+            yield Call(self.results_saver.fail, remove_escapes(item), type(e).__name__ + ': ' + str(e))
+            raise
+
+        finally:
+            yield Call(metrics.save, self.output_folder)
+
+        return True
+
+    def is_pending(self, item):
+        """
+            Whether an item is still to be loaded. Called directly, not as step, to choose the items to prefetch.
+        """
+
+        return not self.results_saver.is_done(remove_escapes(item))
+
+    def scrape_single_item(self, item):
+        raise NotImplementedError
+
+    def with_retries(self, steps):
+        """
+            Run the steps of a page, retrying with backoff on a human check. steps is a function that returns new
+            steps for each attempt.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                return (yield from steps())
+
+            except HumanCheckException:
+                metrics.increment('human_checks')
+                self.scheduler.report_human_check()
+
+                attempt += 1
+                if attempt > self.scheduler.max_retries:
+                    raise ScrapingException('Human check after ' + str(self.scheduler.max_retries) + ' retries')
+
+                waiting_time = self.scheduler.backoff_delay(attempt)
+
+                print("Please solve the captcha.")
+                print("Another try will be performed within " + str(int(waiting_time)) + " seconds...")
+
+                metrics.increment('retries')
+                yield Sleep(waiting_time)
+
+    def load_page(self, url):
+        """
+            Steps to load the url and check the correct loading of the page and an eventual human check.
+        """
+
+        # Check, if the url is valid (syntax)
+        if not is_url_valid(url):
+            raise ScrapingException
+
+        yield Load(url)
+
+        current_url = yield CurrentUrl()
+        if not str(current_url).strip() == url.strip():
+            if current_url == LINKEDIN_URL + '/in/unavailable/':
+                raise ScrapingException
+            else:
+                raise HumanCheckException
+
+class HashtagSteps(Steps):
+    """
+        Page logic of the hashtag scrapers. Additional settings: scroll_depth, target_posts, max_idle_scrolls,
+        post_index, known_post_ids, known_posts_run and harvest_every, see HashtagScraper.
+    """
+
+    item_kind = 'hashtag'
+
+    def get_hashtag_url(self, hashtag):
+
+        return LINKEDIN_URL + '/feed/hashtag/?keywords=' + hashtag
+
+    def scrape_single_item(self, hashtag):
+        """
+            Steps to scrape a single hashtag and hand the results to the results saver.
+        """
+
+        # Create hashtag url
+        hashtag_url = self.get_hashtag_url(hashtag)
+
+        # Get posts of earlier runs
+        if self.post_index is not None:
+            self.known_post_ids = yield Call(self.post_index.known_post_ids, remove_escapes(hashtag))
+
+        # Scrape hashtag posts of this url
+        hashtag_follower, hashtag_posts, hashtag_scrolls = yield from self.with_retries(lambda: self.pageload_and_scrape_posts(hashtag_url))
+
+        # In snapshot mode, save the expanded feed instead
+        if self.snapshots:
+            with metrics.timer('hashtag_snapshot'):
+                snapshot = Snapshot(
+                    kind='hashtags',
+                    item=remove_escapes(hashtag),
+                    url=hashtag_url,
+                    scraping_date=datetime.now().strftime('%Y-%m-%d %H-%M-%S'),
+                    html=(yield Script(SNAPSHOT_SCRIPT)),
+                    metadata={'scrolls': hashtag_scrolls}
+                )
+                yield Call(snapshot.save, self.output_folder)
+
+            yield Call(self.results_saver.update, snapshot, item=remove_escapes(hashtag))
+            return
+
+        # Keep only new posts
+        hashtag_posts = {post_id: post for post_id, post in hashtag_posts.items() if post_id not in self.known_post_ids}
+
+        # Get date of scraping
+        scraping_date = datetime.now().strftime('%Y-%m-%d %H-%M-%S')
+
+        # Collect results for hashtag in data class
+        hashtag_results = HashtagScrapingResult(
+            hashtag=remove_escapes(hashtag),
+            hashtag_follower=hashtag_follower,
+            scraping_date=remove_escapes(scraping_date),
+            hashtag_posts=hashtag_posts,
+            hashtag_scrolls=hashtag_scrolls
+        )
+
+        # Save to file
+        yield Call(self.results_saver.update, hashtag_results, item=remove_escapes(hashtag))
+
+    def pageload_and_scrape_posts(self, hashtag_url):
+        """
+            Steps to load the full page (to a certain extend) by "scrolling" down and scrape all posts that have been loaded.
+        """
+
+        # Load the url
+        with metrics.timer('hashtag_page_load'):
+            yield from self.load_page(hashtag_url)
+
+        # Load the next hashtags in the background
+        yield Prefetch(self.upcoming_urls, discard_others=True)
+
+        # Scroll down to see more posts
+        self.harvested_posts = []
+        with metrics.timer('hashtag_scroll'):
+            scrolls = yield from self.load_full_page()
+
+        # Leave the extraction to the parse stage in snapshot mode
+        if self.snapshots:
+            return None, None, scrolls
+
+        # Scrape posts
+        with metrics.timer('hashtag_extraction'):
+            posts = yield from self.scrape_posts()
+
+        # Scrape number of hashtag followers
+        with metrics.timer('hashtag_followers'):
+            followers = yield Script(HASHTAG_FOLLOWERS_SCRIPT)
+
+        return followers, posts, scrolls
+
+    def scrape_posts(self):
+        """
+            Steps to scrape all posts from the loaded hashtag feed with a single script call.
+        """
+
+        # Extract the raw fields of all posts at once, in addition to the posts harvested while scrolling
+        raw_posts = self.harvested_posts + (yield Script(SCRAPE_POSTS_SCRIPT, self.harvest_every > 0))
+        self.harvested_posts = []
+
+        posts, failures = parse_raw_posts(raw_posts)
+
+        # Report failed fields
+        if failures:
+            print("Skipped " + str(len(raw_posts) - len(posts)) + " of " + str(len(raw_posts)) + " posts. Missing fields: " + json.dumps(failures))
+
+        return posts
+
+    def load_full_page(self):
+        """
+            Steps to load the full page by imitating a "scrolling". Returns the number of scrolls.
+        """
+
+        window_height = yield Script("return window.innerHeight")
+
+        scrolls = 1
+        idle_scrolls = 0
+        num_data_ids = 0
+        known_run = 0
+        while True:
+
+            # Stop at the bottom of the page. With a target, scroll on at the bottom until it is idle, see below.
+            if self.target_posts is None and scrolls * window_height >= (yield Script("return document.body.offsetHeight")):
+                break
+
+            yield Script('window.scrollTo(0, ' + str(window_height * scrolls) + ');')
+
+            # Wait until the page extends below the viewport. Returns immediately, if we have not scrolled to the
+            # bottom yet, and otherwise as soon as more content has been loaded.
+            extends = yield WaitFor("window.scrollY + window.innerHeight < document.body.offsetHeight", timeout=3)
+
+            scrolls += 1
+
+            # Stop when enough posts have been loaded or scrolling does not load new posts anymore. Only a scroll that
+            # reached the bottom without the page growing is idle, not one that moved down through loaded posts.
+            if self.target_posts is not None:
+                num_posts = yield Script(COUNT_POSTS_SCRIPT)
+                if num_posts >= int(self.target_posts):
+                    break
+
+                idle_scrolls = 0 if extends else idle_scrolls + 1
+                if idle_scrolls >= int(self.max_idle_scrolls):
+                    break
+
+            # Stop when we reached the posts of earlier runs
+            if self.known_post_ids:
+                new_data_ids = yield Script(COLLECT_DATA_IDS_SCRIPT, num_data_ids)
+                num_data_ids += len(new_data_ids)
+
+                for data_id in new_data_ids:
+                    known_run = known_run + 1 if get_post_id(data_id) in self.known_post_ids else 0
+
+                if known_run >= int(self.known_posts_run):
+                    break
+
+            # Harvest the loaded posts and remove them from the page
+            if self.harvest_every > 0 and scrolls % self.harvest_every == 0:
+                with metrics.timer('hashtag_harvest'):
+                    harvested_posts = yield Script(SCRAPE_POSTS_SCRIPT, True)
+
+                self.harvested_posts += harvested_posts
+                metrics.increment('harvested_posts', len(harvested_posts))
+
+            # DEBUG: Manual break loop (for dev)
+            if scrolls > int(self.scroll_depth):
+                break
+
+        return scrolls
+
+class ProfileSteps(Steps):
+    """
+        Page logic of the profile scrapers. Additional settings: wait_timeout, company_cache, profile_store,
+        profile_max_age, stored_profile and fingerprint, see ProfileScraper.
+    """
+
+    item_kind = 'profile'
+
+    def get_profile_url(self, profile):
+
+        return LINKEDIN_URL + '/in/' + remove_escapes(profile) + '/'
+
+    def is_fresh(self, stored_profile):
+        """
+            Whether a stored profile was scraped less than profile_max_age seconds ago, so that it is not scraped again.
+        """
+
+        return stored_profile is not None and time.time() - stored_profile['scraped_at'] <= self.profile_max_age
+
+    def is_pending(self, profile):
+
+        if not Steps.is_pending(self, profile):
+            return False
+
+        return self.profile_store is None or not self.is_fresh(self.profile_store.get(remove_escapes(profile)))
+
+    def scrape_single_item(self, profile):
+        """
+            Steps to scrape a single profile and hand the results to the results saver.
+        """
+
+        # Create profile url
+        profile_url = self.get_profile_url(profile)
+
+        # Re-emit the stored result of a recently scraped profile
+        if self.profile_store is not None:
+            self.stored_profile = yield Call(self.profile_store.get, remove_escapes(profile))
+
+            if self.is_fresh(self.stored_profile):
+                metrics.increment('profiles_fresh')
+                yield Call(self.results_saver.update, ProfileScrapingResult(
+                    profile=remove_escapes(profile),
+                    scraping_date=self.stored_profile['scraping_date'],
+                    profile_information=self.stored_profile['profile_information']
+                ), item=remove_escapes(profile))
+                return
+
+        # Scrape profile
+        profile_information = yield from self.with_retries(lambda: self.load_and_scrape_profile(profile_url))
+
+        # Get date of scraping
+        scraping_date = datetime.now().strftime('%Y-%m-%d %H-%M-%S')
+
+        # In snapshot mode, save the expanded profile instead
+        if self.snapshots:
+            profile_information.item = remove_escapes(profile)
+            profile_information.scraping_date = scraping_date
+
+            with metrics.timer('profile_snapshot'):
+                yield Call(profile_information.save, self.output_folder)
+
+            yield Call(self.results_saver.update, profile_information, item=remove_escapes(profile))
+            return
+
+        # Collect results for profile in data class
+        profile_results = ProfileScrapingResult(
+            profile=remove_escapes(profile),
+            scraping_date=scraping_date,
+            profile_information=profile_information.as_json()
+        )
+
+        # Remember the result for the next runs
+        if self.profile_store is not None:
+            if (yield Call(self.profile_store.put, profile_results, self.fingerprint)):
+                metrics.increment('profiles_changed')
+
+        # Save to file
+        yield Call(self.results_saver.update, profile_results, item=remove_escapes(profile))
+
+    def load_and_scrape_profile(self, profile_url):
+        """
+            Steps to load, expand and extract a profile. In snapshot mode, returns the snapshot of the expanded page.
+        """
+
+        with metrics.timer('profile_page_load'):
+            yield from self.load_page(profile_url)
+
+        # Load the next profile in the background
+        yield Prefetch(self.upcoming_urls, discard_others=True)
+
+        # With a profile store, let the script take the fingerprint of the page and stop before expanding the profile,
+        # if the page has not changed since the stored result was scraped
+        stored_fingerprint = None
+        if self.profile_store is not None:
+            stored_fingerprint = self.stored_profile['fingerprint'] if self.stored_profile is not None else ''
+
+        # Expand and extract the whole profile with a single script call
+        with metrics.timer('profile_extraction'):
+            raw_profile = yield Script(SCRAPE_PROFILE_SCRIPT, self.wait_timeout * 1000, self.snapshots, stored_fingerprint, asynchronous=True)
+
+        if 'error' in raw_profile:
+            raise ScrapingException(raw_profile['error'])
+
+        # Record the phases measured in the page
+        for phase, duration in raw_profile['timings'].items():
+            metrics.observe('profile_' + phase, duration / 1000)
+
+        # Reuse the stored profile, if the page has not changed
+        self.fingerprint = raw_profile.get('fingerprint', '')
+        if raw_profile.get('unchanged'):
+            metrics.increment('profiles_unchanged')
+            return Profile(**self.stored_profile['profile_information'])
+
+        # Load the company pages that are not cached in the remaining background tabs
+        yield Prefetch([job[2] for job in raw_profile['jobs'] if job[2] != '' and not self.company_cache.contains(job[2])])
+
+        # Look up the companies first, as build_jobs takes them from a function
+        company_details = {}
+        with metrics.timer('profile_jobs'):
+            for job in raw_profile['jobs']:
+                if job[2] != '' and job[2] not in company_details:
+                    company_details[job[2]] = yield from self.scrape_company_details(job[2])
+
+        # In snapshot mode, keep the company details with the snapshot, as their pages are not part of it
+        if self.snapshots:
+            companies = {normalize_company_url(company_url): list(details) for company_url, details in company_details.items()}
+
+            return Snapshot(kind='profiles', item=None, url=profile_url, scraping_date=None,
+                            html=raw_profile['html'], metadata={'companies': companies})
+
+        return Profile(
+            name=raw_profile['name'],
+            email=raw_profile['email'],
+            skills=raw_profile['skills'],
+            current_employer=raw_profile['current_employer'],
+            jobs=build_jobs(raw_profile['jobs'], company_details.get)
+        )
+
+    def scrape_company_details(self, company_url):
+        """
+            Steps to get (industry, employees) of a company, from the cache or its page.
+        """
+
+        # Use cached company details if available
+        company_details = yield Call(self.company_cache.get, company_url)
+        if company_details is not None:
+            return company_details
+
+        with metrics.timer('company_page'):
+            yield Load(company_url)
+            company_industry, company_employees = yield Script(COMPANY_DETAILS_SCRIPT)
+
+        # Only cache successful lookups
+        if company_industry or company_employees:
+            yield Call(self.company_cache.put, company_url, company_industry, company_employees)
+
+        return company_industry, company_employees
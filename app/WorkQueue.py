@@ -0,0 +1,319 @@
+from threading import Lock
+from urllib.parse import urlsplit
+
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+
+class WorkQueue():
+    """
+        Base class of the work queues shared by scrapers on several processes or hosts. Items are leased for
+        lease_timeout seconds. An item that is neither acknowledged nor failed within its lease, e.g. because its node
+        died, is leased again. After max_attempts failed or expired leases, the item is moved to the dead letters.
+    """
+
+    def __init__(self, name, lease_timeout=900, max_attempts=3, poll_interval=5):
+        self.name = name
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+
+        # Holder of the leases, so that a late renew or nack after the lease has moved on to another worker is ignored
+        self.worker = socket.gethostname() + ':' + str(os.getpid()) + ':' + uuid.uuid4().hex[:8]
+
+    def add(self, items, batch_size=1000):
+        """
+            Add the items. Items that have been added before, by this or another node, are ignored.
+        """
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                self.add_batch(batch)
+                batch = []
+
+        if batch:
+            self.add_batch(batch)
+
+    def iterate(self):
+        """
+            Lease items until the queue is drained. While other nodes hold leases, wait for them to finish or expire.
+        """
+        while True:
+            item = self.lease()
+            if item is not None:
+                yield item
+                continue
+
+            if self.is_drained():
+                return
+
+            time.sleep(self.poll_interval)
+
+    def add_batch(self, items):
+        raise NotImplementedError
+
+    def lease(self):
+        """
+            Lease the next item. Returns None, if no item is available.
+        """
+        raise NotImplementedError
+
+    def renew(self, item):
+        """
+            Extend the lease of an item by lease_timeout from now, e.g. while it takes long to scrape. Returns False, if
+            the item is not leased anymore.
+        """
+        raise NotImplementedError
+
+    def ack(self, item):
+        """
+            Mark the item as done.
+        """
+        raise NotImplementedError
+
+    def nack(self, item, error=''):
+        """
+            Give the item back to the queue, or move it to the dead letters after max_attempts. Ignored, if the item
+            is not leased by this worker anymore.
+        """
+        raise NotImplementedError
+
+    def is_drained(self):
+        """
+            Check, if no item is queued or leased anymore.
+        """
+        raise NotImplementedError
+
+    def counts(self):
+        raise NotImplementedError
+
+    def dead_letters(self):
+        """
+            Return the items that have been given up with their last error.
+        """
+        raise NotImplementedError
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+        Work queue in a sqlite file, shared by the scrapers of all processes and containers on one host (e.g. with the
+        output folder mounted as volume). Leases are taken in an immediate transaction, so that sqlite's file lock
+        gives each item to one worker only.
+    """
+
+    def __init__(self, queue_file, name, lease_timeout=900, max_attempts=3, poll_interval=5):
+        WorkQueue.__init__(self, name, lease_timeout=lease_timeout, max_attempts=max_attempts, poll_interval=poll_interval)
+
+        self.lock = Lock()
+
+        # Transactions are handled explicitly
+        self.connection = sqlite3.connect(queue_file, timeout=60, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS items (queue TEXT, item TEXT, status TEXT, attempts INTEGER, leased_until REAL, worker TEXT, error TEXT, PRIMARY KEY (queue, item))")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS items_status ON items (queue, status, leased_until)")
+
+    def add_batch(self, items):
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany("INSERT OR IGNORE INTO items VALUES (?, ?, 'queued', 0, 0, '', '')", [(self.name, item) for item in items])
+            self.connection.execute("COMMIT")
+
+    def lease(self):
+        now = time.time()
+
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases go back to the queue or to the dead letters
+                self.connection.execute(
+                    "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'queued' END, error = 'Lease expired' " +
+                    "WHERE queue = ? AND status = 'leased' AND leased_until < ?", (self.max_attempts, self.name, now))
+
+                row = self.connection.execute("SELECT item FROM items WHERE queue = ? AND status = 'queued' LIMIT 1", (self.name,)).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE items SET status = 'leased', attempts = attempts + 1, leased_until = ?, worker = ? WHERE queue = ? AND item = ?",
+                        (now + self.lease_timeout, self.worker, self.name, row[0]))
+
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        return row[0] if row is not None else None
+
+    def renew(self, item):
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE items SET leased_until = ? WHERE queue = ? AND item = ? AND status = 'leased' AND worker = ?",
+                (time.time() + self.lease_timeout, self.name, item, self.worker))
+
+        return cursor.rowcount > 0
+
+    def ack(self, item):
+        with self.lock:
+            self.connection.execute("UPDATE items SET status = 'done', error = '' WHERE queue = ? AND item = ?", (self.name, item))
+
+    def nack(self, item, error=''):
+        with self.lock:
+            self.connection.execute(
+                "UPDATE items SET status = CASE WHEN attempts >= ? THEN 'dead' ELSE 'queued' END, error = ? " +
+                "WHERE queue = ? AND item = ? AND status = 'leased' AND worker = ?", (self.max_attempts, error, self.name, item, self.worker))
+
+    def is_drained(self):
+        with self.lock:
+            row = self.connection.execute("SELECT COUNT(*) FROM items WHERE queue = ? AND status IN ('queued', 'leased')", (self.name,)).fetchone()
+
+        return row[0] == 0
+
+    def counts(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM items WHERE queue = ? GROUP BY status", (self.name,)).fetchall()
+
+        return dict(rows)
+
+    def dead_letters(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT item, error FROM items WHERE queue = ? AND status = 'dead'", (self.name,)).fetchall()
+
+        return dict(rows)
+
+# Lua scripts of the Redis work queue, so that each step is atomic on the server.
+# Keys: queued (list), leased (sorted set by lease end), attempts (hash), dead (hash of errors), items (set), done (set),
+# leased_by (hash of the worker holding the lease)
+
+REDIS_ADD_SCRIPT = """
+    for i, item in ipairs(ARGV) do
+        if redis.call('SADD', KEYS[5], item) == 1 then
+            redis.call('RPUSH', KEYS[1], item)
+        end
+    end
+"""
+
+# Arguments: now, lease timeout, max attempts, worker
+REDIS_LEASE_SCRIPT = """
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+    for i, item in ipairs(expired) do
+        redis.call('ZREM', KEYS[2], item)
+        redis.call('HDEL', KEYS[7], item)
+        if tonumber(redis.call('HGET', KEYS[3], item) or '0') >= tonumber(ARGV[3]) then
+            redis.call('HSET', KEYS[4], item, 'Lease expired')
+        else
+            redis.call('RPUSH', KEYS[1], item)
+        end
+    end
+
+    local item = redis.call('LPOP', KEYS[1])
+    if not item then
+        return false
+    end
+
+    redis.call('ZADD', KEYS[2], tonumber(ARGV[1]) + tonumber(ARGV[2]), item)
+    redis.call('HSET', KEYS[7], item, ARGV[4])
+    redis.call('HINCRBY', KEYS[3], item, 1)
+
+    return item
+"""
+
+# Arguments: item, new end of the lease, worker
+REDIS_RENEW_SCRIPT = """
+    if not redis.call('ZSCORE', KEYS[2], ARGV[1]) or redis.call('HGET', KEYS[7], ARGV[1]) ~= ARGV[3] then
+        return 0
+    end
+
+    redis.call('ZADD', KEYS[2], tonumber(ARGV[2]), ARGV[1])
+    return 1
+"""
+
+REDIS_ACK_SCRIPT = """
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[7], ARGV[1])
+    redis.call('LREM', KEYS[1], 0, ARGV[1])
+    redis.call('SADD', KEYS[6], ARGV[1])
+"""
+
+# Arguments: item, error, max attempts, worker
+REDIS_NACK_SCRIPT = """
+    if not redis.call('ZSCORE', KEYS[2], ARGV[1]) or redis.call('HGET', KEYS[7], ARGV[1]) ~= ARGV[4] then
+        return
+    end
+
+    redis.call('ZREM', KEYS[2], ARGV[1])
+    redis.call('HDEL', KEYS[7], ARGV[1])
+    if tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0') >= tonumber(ARGV[3]) then
+        redis.call('HSET', KEYS[4], ARGV[1], ARGV[2])
+    else
+        redis.call('RPUSH', KEYS[1], ARGV[1])
+    end
+"""
+
+class RedisWorkQueue(WorkQueue):
+    """
+        Work queue on a Redis server (or any server speaking its protocol with Lua scripting), shared by the scrapers
+        on many hosts. Requires the package redis. Lease ends are set with the clock of the leasing host, so the clocks
+        of the hosts should be synchronized.
+    """
+
+    def __init__(self, redis_url, name, lease_timeout=900, max_attempts=3, poll_interval=5, client=None):
+        WorkQueue.__init__(self, name, lease_timeout=lease_timeout, max_attempts=max_attempts, poll_interval=poll_interval)
+
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                sys.exit("A Redis work queue requires redis.")
+
+            client = redis.Redis.from_url(redis_url, decode_responses=True)
+
+        self.client = client
+        self.keys = ['linkedin_scraper:' + name + ':' + key for key in ['queued', 'leased', 'attempts', 'dead', 'items', 'done', 'leased_by']]
+
+        self.add_script = self.client.register_script(REDIS_ADD_SCRIPT)
+        self.lease_script = self.client.register_script(REDIS_LEASE_SCRIPT)
+        self.renew_script = self.client.register_script(REDIS_RENEW_SCRIPT)
+        self.ack_script = self.client.register_script(REDIS_ACK_SCRIPT)
+        self.nack_script = self.client.register_script(REDIS_NACK_SCRIPT)
+
+    def add_batch(self, items):
+        self.add_script(keys=self.keys, args=items)
+
+    def lease(self):
+        return self.lease_script(keys=self.keys, args=[time.time(), self.lease_timeout, self.max_attempts, self.worker])
+
+    def renew(self, item):
+        return self.renew_script(keys=self.keys, args=[item, time.time() + self.lease_timeout, self.worker]) == 1
+
+    def ack(self, item):
+        self.ack_script(keys=self.keys, args=[item])
+
+    def nack(self, item, error=''):
+        self.nack_script(keys=self.keys, args=[item, error, self.max_attempts, self.worker])
+
+    def is_drained(self):
+        return self.client.llen(self.keys[0]) == 0 and self.client.zcard(self.keys[1]) == 0
+
+    def counts(self):
+        return dict(queued=self.client.llen(self.keys[0]),
+                    leased=self.client.zcard(self.keys[1]),
+                    done=self.client.scard(self.keys[5]),
+                    dead=self.client.hlen(self.keys[3]))
+
+    def dead_letters(self):
+        return self.client.hgetall(self.keys[3])
+
+def open_work_queue(url, name, lease_timeout=900, max_attempts=3):
+    """
+        Open the work queue of the given url: sqlite:///path/to/file.sqlite or redis://host:port/db.
+    """
+    scheme = urlsplit(url).scheme
+
+    if scheme == 'sqlite':
+        return SQLiteWorkQueue(url[len('sqlite:///'):], name, lease_timeout=lease_timeout, max_attempts=max_attempts)
+
+    if scheme in ['redis', 'rediss', 'unix']:
+        return RedisWorkQueue(url, name, lease_timeout=lease_timeout, max_attempts=max_attempts)
+
+    sys.exit("Work queue not specified. Use sqlite:///<file> or redis://<host>:<port>/<db>.")
@@ -1,52 +1,211 @@
+import time
+
+# Start of the process for the startup timing
+start_time = time.time()
+
+import itertools
 import os
 import json
 import sys
-import time
-import xlsxwriter
 
-from Scraper import HashtagScraper, ProfileScraper
+from Scraper import HashtagScraper, ProfileScraper, ScraperPool, get_chromedriver_path
+from utils import Scheduler, StreamingQueue, check_output_format, read_input, startup
+
+startup.begin(start_time)
+
+# Number of parallel scrapers, each with its own Chrome instance
+workers = int(os.getenv('WORKERS', 1))
+
+# Rate limit and backoff shared by all workers
+scheduler = Scheduler(
+    requests_per_minute=float(os.getenv('REQUESTS_PER_MINUTE', 0)) or None,
+    max_delay=int(os.getenv('MAX_BACKOFF', 600)),
+    max_retries=int(os.getenv('MAX_RETRIES', 5))
+)
+
+# Resource types and URL patterns that Chrome should not download, e.g. "images,fonts,media"
+block_resources = os.getenv('BLOCK_RESOURCES').split(',') if os.getenv('BLOCK_RESOURCES') else None
+
+# Optional maximum age of the stored result of a profile in seconds, e.g. 604800 to scrape each profile at most weekly
+profile_max_age = int(os.getenv('PROFILE_MAX_AGE')) if os.getenv('PROFILE_MAX_AGE') else None
+
+# Optional shard of the input, e.g. SHARD_INDEX=0 to 3 with NUM_SHARDS=4 on four containers
+shard_index = int(os.getenv('SHARD_INDEX', 0))
+num_shards = int(os.getenv('NUM_SHARDS', 1))
+
+if not 0 <= shard_index < num_shards:
+    sys.exit("SHARD_INDEX has to be between 0 and NUM_SHARDS - 1.")
 
-if os.getenv('SCRAPER') == 'hashtags':
-    # Loading of input data
-    hashtags = []
-    for hashtag in open('../input/input_hashtags.txt', "r"):
-        hashtags.append(hashtag)
+def open_input(input_file, kind):
+    """
+        Stream the normalized and deduplicated items of this shard from the input file into a queue. With a work
+        queue, the items are added to it and the scrapers lease them from there.
+    """
+    items = read_input(input_file, kind, shard_index=shard_index, num_shards=num_shards)
 
-    # Warning if hashtags are not provided
-    if len(hashtags) == 0:
+    if os.getenv('WORK_QUEUE'):
+        from WorkQueue import open_work_queue
+
+        work_queue = open_work_queue(os.getenv('WORK_QUEUE'), kind,
+                                     lease_timeout=int(os.getenv('LEASE_TIMEOUT', 900)),
+                                     max_attempts=int(os.getenv('MAX_ATTEMPTS', 3)))
+
+        # Nodes without input file only work on the items added by others
+        if os.path.exists(input_file):
+            work_queue.add(items)
+
+        return work_queue
+
+    # Warning if items are not provided
+    first_item = next(items, None)
+    if first_item is None:
         print("Please provide an input.")
         sys.exit(0)
 
+    return StreamingQueue(itertools.chain([first_item], items))
+
+# Engine: selenium (default) or cdp, which drives WORKERS pages of one Chrome instance from an event loop
+engine = os.getenv('ENGINE', 'selenium')
+
+if engine == 'cdp':
+    # Options of the selenium engine, which the cdp engine does not support
+    unsupported = {
+        'TABS': int(os.getenv('TABS', 1)) > 1,
+        'PROFILE_SAMPLE_RATE': float(os.getenv('PROFILE_SAMPLE_RATE', 0)) > 0
+    }
+    unsupported = [name for name, is_set in unsupported.items() if is_set]
+
+    if unsupported:
+        sys.exit("ENGINE=cdp does not support " + ", ".join(unsupported) + ".")
+
+    from AsyncScraper import AsyncScraperPool, AsyncHashtagScraper, AsyncProfileScraper, find_chrome
+
+# Check the configuration here, as the scrapers run on other threads, where sys.exit would not stop the process
+if os.getenv('SCRAPER'):
+    check_output_format(os.getenv('OUTPUT_FORMAT'))
+
+if os.getenv('SCRAPER') in ['hashtags', 'profiles']:
+    try:
+        if engine == 'cdp':
+            find_chrome()
+        else:
+            get_chromedriver_path()
+    except FileNotFoundError as e:
+        sys.exit(str(e))
+
+if os.getenv('SCRAPER') == 'hashtags' and engine == 'cdp':
+    # Streaming of input data
+    hashtags = open_input('../input/input_hashtags.txt', 'hashtags')
+
+    # Launch async HashtagScraper
+    s = AsyncScraperPool(
+        scraper_class=AsyncHashtagScraper,
+        num_pages=workers,
+        linkedin_username=os.getenv('LINKEDIN_EMAIL'),
+        linkedin_password=os.getenv('LINKEDIN_PASSWORD'),
+        items=hashtags,
+        scroll_depth=os.getenv('SCROLL_DEPTH', 50),
+        target_posts=os.getenv('TARGET_POSTS'),
+        max_idle_scrolls=os.getenv('MAX_IDLE_SCROLLS', 3),
+        incremental=os.getenv('INCREMENTAL') == 'true',
+        known_posts_run=os.getenv('KNOWN_POSTS_RUN', 10),
+        output_format=os.getenv('OUTPUT_FORMAT'),
+        resume=os.getenv('RESUME') == 'true',
+        block_resources=block_resources,
+        scheduler=scheduler,
+        snapshots=os.getenv('SNAPSHOTS') == 'true',
+        harvest_every=int(os.getenv('HARVEST_EVERY', 0))
+    )
+
+    s.start()
+
+elif os.getenv('SCRAPER') == 'profiles' and engine == 'cdp':
+    # Streaming of input data
+    profiles = open_input('../input/input_profiles.txt', 'profiles')
+
+    # Launch async ProfileScraper
+    s = AsyncScraperPool(
+        scraper_class=AsyncProfileScraper,
+        num_pages=workers,
+        linkedin_username=os.getenv('LINKEDIN_EMAIL'),
+        linkedin_password=os.getenv('LINKEDIN_PASSWORD'),
+        items=profiles,
+        output_format=os.getenv('OUTPUT_FORMAT'),
+        resume=os.getenv('RESUME') == 'true',
+        block_resources=block_resources,
+        scheduler=scheduler,
+        wait_timeout=int(os.getenv('WAIT_TIMEOUT', 5)),
+        company_cache_ttl=int(os.getenv('COMPANY_CACHE_TTL', 30*24*60*60)),
+        company_cache_size=int(os.getenv('COMPANY_CACHE_SIZE', 10000)),
+        snapshots=os.getenv('SNAPSHOTS') == 'true',
+        profile_max_age=profile_max_age
+    )
+
+    s.start()
+
+elif os.getenv('SCRAPER') == 'hashtags':
+    # Streaming of input data
+    hashtags = open_input('../input/input_hashtags.txt', 'hashtags')
+
     # Launch HashtagScraper
-    s = HashtagScraper(
+    s = ScraperPool(
+        scraper_class=HashtagScraper,
+        num_workers=workers,
         linkedin_username=os.getenv('LINKEDIN_EMAIL'),
         linkedin_password=os.getenv('LINKEDIN_PASSWORD'),
-        hashtags=hashtags,
+        items=hashtags,
         headless='HEADLESS',
-        scroll_depth=os.getenv('SCROLL_DEPTH'),
-        output_format=os.getenv('OUTPUT_FORMAT')
+        scroll_depth=os.getenv('SCROLL_DEPTH', 50),
+        target_posts=os.getenv('TARGET_POSTS'),
+        max_idle_scrolls=os.getenv('MAX_IDLE_SCROLLS', 3),
+        incremental=os.getenv('INCREMENTAL') == 'true',
+        known_posts_run=os.getenv('KNOWN_POSTS_RUN', 10),
+        output_format=os.getenv('OUTPUT_FORMAT'),
+        resume=os.getenv('RESUME') == 'true',
+        block_resources=block_resources,
+        profile_sample_rate=os.getenv('PROFILE_SAMPLE_RATE', 0),
+        scheduler=scheduler,
+        snapshots=os.getenv('SNAPSHOTS') == 'true',
+        tabs=int(os.getenv('TABS', 1)),
+        harvest_every=int(os.getenv('HARVEST_EVERY', 0))
     )
 
     s.start()
 
 elif os.getenv('SCRAPER') == 'profiles':
-    # Loading of input data
-    profiles = []
-    for profile in open('../input/input_profiles.txt', "r"):
-        profiles.append(profile)
-
-    # Warning if profiles are not provided
-    if len(profiles) == 0:
-        print("Please provide an input.")
-        sys.exit(0)
+    # Streaming of input data
+    profiles = open_input('../input/input_profiles.txt', 'profiles')
 
     # Launch Scraper
-    s = ProfileScraper(
+    s = ScraperPool(
+        scraper_class=ProfileScraper,
+        num_workers=workers,
         linkedin_username=os.getenv('LINKEDIN_EMAIL'),
         linkedin_password=os.getenv('LINKEDIN_PASSWORD'),
-        profiles=profiles,
+        items=profiles,
         headless='HEADLESS',
-        output_format=os.getenv('OUTPUT_FORMAT')
+        output_format=os.getenv('OUTPUT_FORMAT'),
+        resume=os.getenv('RESUME') == 'true',
+        block_resources=block_resources,
+        profile_sample_rate=os.getenv('PROFILE_SAMPLE_RATE', 0),
+        scheduler=scheduler,
+        wait_timeout=int(os.getenv('WAIT_TIMEOUT', 5)),
+        company_cache_ttl=int(os.getenv('COMPANY_CACHE_TTL', 30*24*60*60)),
+        company_cache_size=int(os.getenv('COMPANY_CACHE_SIZE', 10000)),
+        snapshots=os.getenv('SNAPSHOTS') == 'true',
+        tabs=int(os.getenv('TABS', 1)),
+        profile_max_age=profile_max_age
     )
 
-    s.start()
\ No newline at end of file
+    s.start()
+
+elif os.getenv('SCRAPER') in ['parse_hashtags', 'parse_profiles']:
+    # Parse the snapshots of an earlier run in a pool of processes
+    from Parser import parse_snapshots
+
+    parse_snapshots(
+        kind=os.getenv('SCRAPER').split('_')[1],
+        output_format=os.getenv('OUTPUT_FORMAT'),
+        processes=int(os.getenv('PARSE_PROCESSES', 0)) or None,
+        resume=os.getenv('RESUME') == 'true'
+    )
\ No newline at end of file
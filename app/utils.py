@@ -1,7 +1,25 @@
+import cProfile
+import gzip
+import hashlib
 import json
+import os
+import random
 import re
+import sqlite3
+import sys
 import time
-import pandas as pd
+
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+from urllib.parse import urlsplit
+
+from WorkQueue import WorkQueue
+
+# Base url of LinkedIn. Can be changed to run against a local test server.
+LINKEDIN_URL = os.getenv('LINKEDIN_URL', 'https://www.linkedin.com').rstrip('/')
 
 
 class AuthenticationException(Exception):
@@ -23,12 +41,26 @@ class CannotProceedScrapingException(Exception):
     """Human Check from Linkedin during an headless mode execution"""
     pass
 
+# Columns of the flat hashtag output
+POST_FIELDS = ['username','user_profile_id','userdescription','published','published_at','text','data_id']
+HASHTAG_COLUMNS = ['hashtag','hashtag_follower','hashtag_follower_count','scraping_date'] + ['post_id'] + POST_FIELDS
+
+# Supported output formats
+OUTPUT_FORMATS = ['csv', 'json', 'jsonl', 'parquet']
+
+# Format of dates in the output
+DATE_FORMAT = '%Y-%m-%d %H-%M-%S'
+
+# Types of the columns in typed outputs (parquet), other columns are strings
+COLUMN_TYPES = {'scraping_date': 'timestamp', 'published_at': 'timestamp', 'hashtag_follower_count': 'int'}
+
 class Post:
-    def __init__(self, username: str, user_profile_id: str, userdescription: str, published: str, text: str, data_id: str):
+    def __init__(self, username: str, user_profile_id: str, userdescription: str, published: str, text: str, data_id: str, published_at: str = ''):
         self.username = username
         self.user_profile_id = user_profile_id
         self.userdescription = userdescription
         self.published = published
+        self.published_at = published_at
         self.text = text
         self.data_id = data_id
 
@@ -37,41 +69,67 @@ class Post:
                     user_profile_id=self.user_profile_id,
                     userdescription=self.userdescription,
                     published=self.published,
+                    published_at=self.published_at,
                     text=self.text,
                     data_id=self.data_id
                 )
 
 class HashtagScrapingResult:
-    def __init__(self, hashtag: str, hashtag_follower: str, scraping_date: str, hashtag_posts: {str}):
+    def __init__(self, hashtag: str, hashtag_follower: str, scraping_date: str, hashtag_posts: {str}, hashtag_scrolls: int = None, hashtag_follower_count: int = None):
         self.hashtag = hashtag
         self.hashtag_follower = hashtag_follower
+        self.hashtag_follower_count = hashtag_follower_count
         self.scraping_date = scraping_date
         self.hashtag_posts = hashtag_posts
+        self.hashtag_scrolls = hashtag_scrolls
 
     def as_json(self):
         d = {}
         d[self.hashtag] = {
             'hashtag_follower':self.hashtag_follower,
+            'hashtag_follower_count':self.hashtag_follower_count,
             'scraping_date':self.scraping_date, 
+            'hashtag_scrolls':self.hashtag_scrolls,
             'hashtag_posts':self.hashtag_posts
         }
         return d
 
     def as_dataframe(self):
-        # Initialize df. Add columns dynamically, as we only have to change the columns in one place above.
-        cols = ['hashtag','hashtag_follower','scraping_date'] + ['post_id'] + ['username','user_profile_id','userdescription','published','text','data_id']
-        df = pd.DataFrame(columns=cols)
+        return hashtag_results_as_dataframe([self])
 
-        # Loop over all hastag urls
-        for key in self.hashtag_posts.keys():
-            df = df.append({**{'hashtag':self.hashtag},
-                            **{'hashtag_follower':self.hashtag_follower},
-                            **{'scraping_date':self.scraping_date},
-                            **{'post_id':key},
-                            **self.hashtag_posts[key]},
-                 ignore_index=True)
+    def as_columns(self):
+        return hashtag_results_as_columns([self])
 
-        return df
+def hashtag_results_as_dataframe(hashtag_results):
+    """
+        Helper to build one flat dataframe from the posts of several hashtag results. The columns are collected as
+        lists first, so that the dataframe is allocated only once.
+    """
+    import pandas as pd
+
+    return pd.DataFrame(hashtag_results_as_columns(hashtag_results), columns=HASHTAG_COLUMNS)
+
+def hashtag_results_as_columns(hashtag_results):
+    """
+        Helper to collect the columns of the flat hashtag output from several hashtag results.
+    """
+    # Initialize columns
+    columns = {col: [] for col in HASHTAG_COLUMNS}
+
+    # Loop over all hashtags and their posts
+    for result in hashtag_results:
+        hashtag_posts = result.hashtag_posts or {}
+
+        columns['hashtag'] += [result.hashtag] * len(hashtag_posts)
+        columns['hashtag_follower'] += [result.hashtag_follower] * len(hashtag_posts)
+        columns['hashtag_follower_count'] += [result.hashtag_follower_count] * len(hashtag_posts)
+        columns['scraping_date'] += [result.scraping_date] * len(hashtag_posts)
+        columns['post_id'] += list(hashtag_posts.keys())
+
+        for field in POST_FIELDS:
+            columns[field] += [post.get(field) for post in hashtag_posts.values()]
+
+    return columns
 
 def is_url_valid(url):
     regex = re.compile(
@@ -83,30 +141,291 @@ def is_url_valid(url):
         r'(?:/?|[/?]\S+)$', re.IGNORECASE)
     return re.match(regex, url) is not None
 
-def wait_for_loading():
-    time.sleep(2)
+class Metrics():
+    """
+        Durations of the scraping phases and counters of events, shared by all scrapers of a process. Saved as
+        Prometheus text file and as json summary.
+    """
+
+    # Upper bounds of the histogram buckets in seconds
+    buckets = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float('inf')]
+
+    def __init__(self):
+        self.lock = Lock()
+        self.phases = {}
+        self.counters = {}
+
+    @contextmanager
+    def timer(self, phase):
+        """
+            Measure the duration of the enclosed code as phase.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(phase, time.perf_counter() - start)
+
+    def observe(self, phase, duration):
+        with self.lock:
+            if phase not in self.phases:
+                self.phases[phase] = dict(buckets=[0] * len(self.buckets), count=0, sum=0.0, max=0.0)
+
+            histogram = self.phases[phase]
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += duration
+            histogram['max'] = max(histogram['max'], duration)
+
+    def increment(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
 
-def wait_for_scrolling():
-    time.sleep(1)
+    def as_prometheus(self):
+        lines = ['# HELP linkedin_scraper_phase_seconds Duration of the scraping phases.',
+                 '# TYPE linkedin_scraper_phase_seconds histogram']
+        for phase, histogram in sorted(self.phases.items()):
+            for bound, count in zip(self.buckets, histogram['buckets']):
+                le = '+Inf' if bound == float('inf') else str(bound)
+                lines.append('linkedin_scraper_phase_seconds_bucket{phase="' + phase + '",le="' + le + '"} ' + str(count))
+            lines.append('linkedin_scraper_phase_seconds_sum{phase="' + phase + '"} ' + str(histogram['sum']))
+            lines.append('linkedin_scraper_phase_seconds_count{phase="' + phase + '"} ' + str(histogram['count']))
+
+        for counter, value in sorted(self.counters.items()):
+            lines.append('# TYPE linkedin_scraper_' + counter + '_total counter')
+            lines.append('linkedin_scraper_' + counter + '_total ' + str(value))
+
+        return '\n'.join(lines) + '\n'
+
+    def as_json(self):
+        phases = {}
+        for phase, histogram in self.phases.items():
+            phases[phase] = dict(count=histogram['count'],
+                                 sum=round(histogram['sum'], 3),
+                                 mean=round(histogram['sum'] / histogram['count'], 3),
+                                 max=round(histogram['max'], 3))
+
+        return dict(phases=phases, counters=dict(self.counters))
+
+    def save(self, output_folder):
+        """
+            Write metrics.prom and metrics.json to the output folder. Files are replaced atomically, so that they can
+            be collected while scraping.
+        """
+        with self.lock:
+            files = {'metrics.prom': self.as_prometheus(), 'metrics.json': json.dumps(self.as_json(), indent=4)}
+
+            for name, content in files.items():
+                with open(output_folder + name + '.tmp', 'w') as outfile:
+                    outfile.write(content)
+                os.replace(output_folder + name + '.tmp', output_folder + name)
+
+# Metrics of this process
+metrics = Metrics()
+
+class StartupLog():
+    """
+        Durations of the startup phases of the process (imports, chromedriver, Chrome, login), reported once together
+        with the time to the first page request.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.start_time = time.time()
+        self.phases = {}
+        self.reported = False
+
+    def begin(self, start_time):
+        """
+            Set the start of the process, the time until now is recorded as imports.
+        """
+        self.start_time = start_time
+        self.phases['imports'] = round(time.time() - start_time, 3)
+
+    @contextmanager
+    def phase(self, phase):
+        """
+            Measure the duration of the enclosed code as phase. Only the first measurement of a phase is kept.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases.setdefault(phase, round(time.time() - start, 3))
+
+    def report_first_request(self):
+        """
+            Print the startup phases at the first page request of the process.
+        """
+        with self.lock:
+            if self.reported:
+                return
+            self.reported = True
+
+            self.phases['first_request'] = round(time.time() - self.start_time, 3)
+            phases = dict(self.phases)
+
+        for phase, duration in phases.items():
+            metrics.observe('startup_' + phase, duration)
+
+        print("Startup: " + json.dumps(phases))
+
+# Startup timing of this process
+startup = StartupLog()
+
+@contextmanager
+def sample_profile(sample_rate, output_folder, item):
+    """
+        Run the enclosed code under cProfile for a random share sample_rate of the items and save the statistics to
+        the folder cprofile in the output folder.
+    """
+    if sample_rate <= 0 or random.random() >= sample_rate:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+
+        os.makedirs(output_folder + 'cprofile', exist_ok=True)
+        profiler.dump_stats(output_folder + 'cprofile/' + safe_filename(item) + '.prof')
+
+def safe_filename(item):
+    """
+        Helper to turn a hashtag or profile into a file name. Items that differ only in replaced characters, e.g.
+        "café" and "caf_", get distinct names by a short hash of the raw item.
+    """
+    return re.sub(r'[^A-Za-z0-9_-]', '_', item) + '-' + get_content_hash(item)[:10]
+
+class Scheduler():
+    """
+        Request scheduling shared by all scrapers of a process. A token bucket limits the page loads to
+        requests_per_minute (no limit if None). After a human check, retries wait with a capped exponential backoff and
+        jitter. If breaker_threshold human checks happen within breaker_window seconds, the circuit breaker pauses all
+        page loads for breaker_pause seconds.
+    """
+
+    def __init__(self, requests_per_minute=None, burst=5, base_delay=10, max_delay=600, max_retries=5,
+                 breaker_threshold=3, breaker_window=300, breaker_pause=900):
+        self.rate = requests_per_minute / 60 if requests_per_minute else None
+        self.burst = burst
+
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+
+        self.breaker_threshold = breaker_threshold
+        self.breaker_window = breaker_window
+        self.breaker_pause = breaker_pause
+
+        self.lock = Lock()
+        self.tokens = burst
+        self.last_refill = time.time()
+        self.paused_until = 0
+        self.human_checks = []
+
+    def acquire(self):
+        """
+            Wait until the next page load is allowed.
+        """
+        while True:
+            with self.lock:
+                now = time.time()
+
+                if self.paused_until > now:
+                    # Circuit breaker is open
+                    wait = self.paused_until - now
+
+                elif self.rate is None:
+                    return
+
+                else:
+                    # Refill token bucket
+                    self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+                    self.last_refill = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+    def backoff_delay(self, attempt):
+        """
+            Delay before the given retry: Doubles with every attempt up to max_delay, randomized to avoid retrying in
+            lockstep.
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def report_human_check(self):
+        """
+            Record a human check and open the circuit breaker, if they cluster.
+        """
+        with self.lock:
+            now = time.time()
+            self.human_checks = [t for t in self.human_checks if now - t < self.breaker_window] + [now]
+
+            if len(self.human_checks) >= self.breaker_threshold and self.paused_until < now:
+                print("Too many human checks. Pausing all scrapers for " + str(self.breaker_pause) + " seconds...")
+                metrics.increment('circuit_breaker_trips')
+
+                self.paused_until = now + self.breaker_pause
+                self.human_checks = []
+
+def wait_for_condition(browser, condition, timeout=5, poll_frequency=0.1):
+    """
+        Wait until the javascript expression condition is true, but at most timeout seconds. Returns, if the condition
+        has been met.
+    """
+    end_time = time.time() + timeout
+
+    while True:
+        try:
+            if browser.execute_script("return (" + condition + ");"):
+                return True
+        except Exception:
+            pass
+
+        if time.time() >= end_time:
+            return False
+
+        time.sleep(poll_frequency)
+
+# Translation table that removes escape characters
+ESCAPES_TABLE = str.maketrans('', '', ''.join([chr(char) for char in range(1, 32)]))
 
 def remove_escapes(s):
     """
         Helper to remove escape characters from hashtag.
     """
-    # Create escape characters
-    escapes = ''.join([chr(char) for char in range(1, 32)])
+    return s.translate(ESCAPES_TABLE)
 
-    # Instantiate translator
-    translator = s.maketrans('', '', escapes)
+def remove_escapes_batch(texts):
+    """
+        Helper to remove escape characters from many strings with a single translate. The strings are joined by the
+        null character, which is not an escape character, and split again afterwards.
+    """
+    texts = [text or '' for text in texts]
 
-    # Replace
-    t = s.translate(translator)
+    joined = '\0'.join(texts)
+    if joined.count('\0') != len(texts) - 1:
+        # A string contains the separator itself
+        return [remove_escapes(text) for text in texts]
 
-    return t
+    return joined.translate(ESCAPES_TABLE).split('\0') if texts else []
 
 def linkedin_login(browser,linkedin_username,linkedin_password):
 
-    browser.get('https://www.linkedin.com/uas/login')
+    browser.get(LINKEDIN_URL + '/uas/login')
 
     username_input = browser.find_element_by_id('username')
     username_input.send_keys(linkedin_username)
@@ -115,18 +434,106 @@ def linkedin_login(browser,linkedin_username,linkedin_password):
     password_input.send_keys(linkedin_password)
     password_input.submit()
 
+# Only one browser at a time logs in, so that parallel workers can reuse the session of the first one
+login_lock = Lock()
+
+def linkedin_session_login(browser,linkedin_username,linkedin_password,cookie_file):
+    """
+        Login to LinkedIn with the cookies stored in cookie_file. Only if the stored session has expired, login with
+        the credentials and store the cookies of the new session.
+    """
+
+    with login_lock:
+        # Try to restore the stored session
+        if restore_cookies(browser, cookie_file):
+            return
+
+        # Login with credentials
+        linkedin_login(browser,linkedin_username,linkedin_password)
+
+        # Check, if we are on the correct page. After login, we should've been redirected to the feed
+        if not browser.current_url == LINKEDIN_URL + "/feed/":
+            time.sleep(40)
+            raise AuthenticationException()
+
+        save_cookies(browser, cookie_file)
+
+def restore_cookies(browser, cookie_file):
+    """
+        Helper to add stored cookies to the browser. Returns True, if the restored session is logged in.
+    """
+    if not os.path.exists(cookie_file):
+        return False
+
+    with open(cookie_file, 'r') as infile:
+        cookies = json.load(infile)
+
+    # Cookies can only be added for the domain that is currently loaded
+    browser.get(LINKEDIN_URL + '/')
+
+    for cookie in cookies:
+        # Skip expired cookies
+        if 'expiry' in cookie and cookie['expiry'] < time.time():
+            continue
+
+        try:
+            browser.add_cookie(cookie)
+        except Exception:
+            pass
+
+    # A valid session is not redirected to the login page
+    browser.get(LINKEDIN_URL + '/feed/')
+
+    return browser.current_url == LINKEDIN_URL + "/feed/"
+
+def save_cookies(browser, cookie_file):
+    """
+        Helper to store the cookies of the browser. The file is replaced atomically, as other runs might read it.
+    """
+    cookies = []
+    for cookie in browser.get_cookies():
+        # Chrome returns expiry as float, but only accepts int when adding
+        if 'expiry' in cookie:
+            cookie['expiry'] = int(cookie['expiry'])
+        cookies.append(cookie)
+
+    with open(cookie_file + '.tmp', 'w') as outfile:
+        json.dump(cookies, outfile)
+
+    os.replace(cookie_file + '.tmp', cookie_file)
+
+def network_stats(browser):
+    """
+        Helper to count the requests, blocked requests (also per resource type) and loaded bytes since the last call,
+        based on the performance log of Chrome. The size of a blocked resource is unknown, so compare bytes_loaded to
+        a run without blocking to see the bytes saved.
+    """
+    stats = dict(requests=0, blocked_requests=0, bytes_loaded=0, blocked_by_type={})
+
+    # Resource type of each request
+    types = {}
+
+    for entry in browser.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        params = message['params']
+
+        if message['method'] == 'Network.requestWillBeSent':
+            stats['requests'] += 1
+            types[params.get('requestId')] = params.get('type', 'Other')
+        elif message['method'] == 'Network.loadingFailed' and params.get('blockedReason'):
+            stats['blocked_requests'] += 1
+            resource_type = params.get('type') or types.get(params.get('requestId'), 'Other')
+            stats['blocked_by_type'][resource_type] = stats['blocked_by_type'].get(resource_type, 0) + 1
+        elif message['method'] == 'Network.loadingFinished':
+            stats['bytes_loaded'] += int(params.get('encodedDataLength', 0))
+
+    return stats
+
 class Location:
-    def __init__(self, location: str):
+    def __init__(self, location: str, city: str = '', country: str = ''):
         self.location = location
-        self.city = ''
-        self.country = ''
-
-        if ',' in location:
-            try:
-                self.city = location.split(',')[0].strip()
-                self.country = location.split(',')[-1].strip()
-            except:
-                pass
+        self.city = city
+        self.country = country
 
     def reprJSON(self):
         return dict(location=self.location, city=self.city, country=self.country)
@@ -178,6 +585,12 @@ class ProfileScrapingResult:
 
     def as_dataframe(self):
         # Creates flat file in long format for csv export
+        import pandas as pd
+
+        return pd.DataFrame(self.as_columns())
+
+    def as_columns(self):
+        # Creates the columns of the flat file in long format
         # TODO: Write transform more generic (no manual adjustment of cols)
 
         # Initialize
@@ -220,66 +633,1067 @@ class ProfileScrapingResult:
             date_ranges.append(job['date_range'])
 
         # Combine to long format
-        df = pd.DataFrame({'profile_id':profiles,
-                           'scraping_date':scraping_dates,
-                           'name':names,
-                           'email':emails,
-                           'skills':skills,
-                           'current_employer':current_employers,
-                           'job_position':positions,
-                           'job_date_range':date_ranges,
-                           'job_company_name':company_names,
-                           'job_company_industry':company_industrys,
-                           'job_company_employees':company_employees,
-                           'job_location':locations,
-                           'job_location_city':location_citys,
-                           'job_location_country':location_countrys
-                           })
-        
-        return df
-
+        return {'profile_id':profiles,
+                'scraping_date':scraping_dates,
+                'name':names,
+                'email':emails,
+                'skills':skills,
+                'current_employer':current_employers,
+                'job_position':positions,
+                'job_date_range':date_ranges,
+                'job_company_name':company_names,
+                'job_company_industry':company_industrys,
+                'job_company_employees':company_employees,
+                'job_location':locations,
+                'job_location_city':location_citys,
+                'job_location_country':location_countrys
+                }
 
     def is_error(self):
         return self.profile_information is None
 
-class ResultsSaver():
+class JobLedger():
+    """
+        Ledger of the status of each input item (pending, done or failed with an error), stored in a sqlite file. With
+        the status, it keeps the size of the output file after the results of the item, so that the output can be
+        cut back to the last item that has been marked.
+    """
+
+    def __init__(self, ledger_file, reset=False):
+        self.lock = Lock()
+
+        self.connection = sqlite3.connect(ledger_file, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS jobs (item TEXT PRIMARY KEY, status TEXT, error TEXT, updated_at REAL, output_offset INTEGER)")
+
+        # Ledgers of earlier versions have no offsets
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(jobs)").fetchall()]
+        if 'output_offset' not in columns:
+            self.connection.execute("ALTER TABLE jobs ADD COLUMN output_offset INTEGER")
+
+        if reset:
+            self.connection.execute("DELETE FROM jobs")
+        self.connection.commit()
+
+    def status(self, item):
+        with self.lock:
+            row = self.connection.execute("SELECT status FROM jobs WHERE item = ?", (item,)).fetchone()
+
+        return row[0] if row is not None else None
+
+    def mark(self, item, status, error='', output_offset=None):
+        with self.lock:
+            self.connection.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)", (item, status, error, time.time(), output_offset))
+            self.connection.commit()
+
+    def output_offset(self):
+        """
+            Size of the output file after the last marked item, or None if no offset has been recorded.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT MAX(output_offset) FROM jobs").fetchone()
+
+        return row[0]
+
+    def counts(self):
+        with self.lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+
+        return dict(rows)
+
+    def close(self):
+        self.connection.close()
+
+class ParquetOutput():
+    """
+        Helper to stream results to a parquet dataset, i.e. a folder of part files. Rows are buffered and written as
+        compressed row groups of row_group_size rows. A part file is completed after row_groups_per_part row groups
+        and only then renamed to its final name, so that an interrupted run leaves only complete files. As items are
+        only done when their part is complete, a part is also completed after max_part_items items or when its first
+        item is max_part_seconds old.
+    """
+
+    def __init__(self, output_path, append=False, row_group_size=10000, row_groups_per_part=10, compression='snappy', max_part_items=1000, max_part_seconds=60):
+        import pyarrow
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+
+        self.output_path = output_path
+        self.row_group_size = row_group_size
+        self.row_groups_per_part = row_groups_per_part
+        self.compression = compression
+        self.max_part_items = max_part_items
+        self.max_part_seconds = max_part_seconds
+
+        # Remove incomplete part files and, unless appending, the output of previous runs
+        os.makedirs(output_path, exist_ok=True)
+        for name in os.listdir(output_path):
+            if name.endswith('.tmp') or (name.endswith('.parquet') and not append):
+                os.remove(os.path.join(output_path, name))
+
+        # Continue numbering of the part files of a previous run
+        self.num_parts = len([name for name in os.listdir(output_path) if name.endswith('.parquet')])
+
+        self.schema = None
+        self.writer = None
+        self.num_row_groups = 0
+
+        # Buffered rows and the items of the current part file, with the time of its first item
+        self.columns = None
+        self.num_rows = 0
+        self.items = []
+        self.part_started = None
+
+    def write(self, results, item=None):
+        """
+            Buffer the rows of the results. Returns the items whose results are complete on disk.
+        """
+        columns = results.as_columns()
+
+        if self.schema is None:
+            self.schema = self.get_schema(results)
+            self.columns = {name: [] for name in self.schema.names}
+
+        for name in self.columns:
+            self.columns[name] += columns[name]
+        self.num_rows += len(columns[self.schema.names[0]])
+
+        if item is not None:
+            self.items.append(item)
+            if self.part_started is None:
+                self.part_started = time.time()
+
+        if self.num_rows >= self.row_group_size:
+            items = self.write_row_group()
+            if items:
+                return items
+
+        return self.complete_if_due()
+
+    def complete_if_due(self):
+        """
+            Complete the current part, if it has max_part_items items or its first item is max_part_seconds old.
+            Returns the items whose results are complete on disk.
+        """
+        if not self.items:
+            return []
+
+        if len(self.items) < self.max_part_items and time.time() - self.part_started < self.max_part_seconds:
+            return []
+
+        return self.write_row_group() or self.complete_part()
+
+    def get_schema(self, results):
+        if isinstance(results, HashtagScrapingResult):
+            names = HASHTAG_COLUMNS
+        else:
+            names = list(results.as_columns().keys())
+
+        types = {'timestamp': self.pa.timestamp('s'), 'int': self.pa.int64()}
+
+        return self.pa.schema([(name, types.get(COLUMN_TYPES.get(name), self.pa.string())) for name in names])
+
+    def write_row_group(self):
+        if self.num_rows > 0:
+            # Parse dates to typed timestamps, unknown dates are null
+            for name in self.columns:
+                if COLUMN_TYPES.get(name) == 'timestamp':
+                    self.columns[name] = [datetime.strptime(date, DATE_FORMAT) if date else None for date in self.columns[name]]
+
+            if self.writer is None:
+                self.writer = self.pq.ParquetWriter(self.part_path() + '.tmp', self.schema, compression=self.compression)
+
+            self.writer.write_table(self.pa.Table.from_pydict(self.columns, schema=self.schema))
+            self.num_row_groups += 1
+
+            self.columns = {name: [] for name in self.schema.names}
+            self.num_rows = 0
+
+        if self.num_row_groups >= self.row_groups_per_part:
+            return self.complete_part()
+
+        return []
+
+    def complete_part(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.part_path() + '.tmp', self.part_path())
+
+            self.writer = None
+            self.num_row_groups = 0
+            self.num_parts += 1
+
+        items = self.items
+        self.items = []
+        self.part_started = None
+
+        return items
+
+    def part_path(self):
+        return os.path.join(self.output_path, 'part-' + str(self.num_parts).zfill(5) + '.parquet')
+
+    def close(self):
+        """
+            Write the remaining rows. Returns the items whose results are complete on disk.
+        """
+        if self.schema is not None:
+            self.write_row_group()
+
+        return self.complete_part()
+
+def check_output_format(output_format):
+    """
+        Exit, if the output format is not supported or its library is missing. To be called on the main thread before
+        the scrapers are started, as sys.exit on any other thread only ends that thread.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        sys.exit("Output format not specified.")
+
+    if output_format=='parquet':
+        try:
+            import pyarrow
+        except ImportError:
+            sys.exit("Output format parquet requires pyarrow.")
+
+class ResultsSaver(Thread):
     """
-        Helper to save hashtag results to a file dependent on the output format
+        Helper to stream results to a file dependent on the output format. Results are appended by a background
+        thread as they arrive, so that neither the whole output is rewritten nor kept in memory. Each input item is
+        marked as done in the job ledger only after its results have been written to disk. With resume, items that
+        are done are skipped and the output of the previous run is continued. With a post index, the posts of a
+        hashtag are added to it only when the hashtag is marked as done.
     """
 
-    def __init__(self, output_format, output_folder):
+    def __init__(self, output_format, output_folder, output_file, resume=False, work_queue=None, post_index=None):
+
+        # Initialize thread
+        Thread.__init__(self, daemon=True)
+
+        # Checked on the main thread by check_output_format, this only catches direct use
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError("Output format not specified.")
+
         self.output_format = output_format
-        self.output_folder = output_folder
+        self.output_path = output_folder + output_file + '.' + output_format
+        self.resume = resume
 
-    def initialize(self):
-        if self.output_format=='csv':
-            scraping_results = pd.DataFrame()
-        elif self.output_format=='json':
-            scraping_results = {}
-        
-        return scraping_results
+        # Status of input items
+        self.ledger = JobLedger(output_folder + output_file + '_ledger.sqlite', reset=not resume)
+
+        # Shared work queue, if the items are leased from one. Items are acknowledged like they are marked in the ledger.
+        # Until then, the leases of the items in progress are renewed by a heartbeat.
+        self.work_queue = work_queue
+        self.leased_items = set()
+        self.leased_items_lock = Lock()
+        self.heartbeat_stopped = Event()
+
+        if work_queue is not None:
+            Thread(target=self.heartbeat, daemon=True).start()
+
+        # Index of saved posts (incremental mode) and the post ids per item that wait for the item to be done
+        self.post_index = post_index
+        self.pending_post_ids = {}
+
+        # Entries (item, results, error) waiting to be written. None marks the end of the stream.
+        self.queue = Queue()
+        self.error = None
+
+    def run(self):
+        """
+            Write results from the queue until the stream is closed. This function is required by the threading module.
+        """
+
+        try:
+            if self.output_format=='parquet':
+                self.run_parquet()
+                return
+
+            outfile, num_written = self.open_output()
+
+            with outfile:
+                while True:
+                    entry = self.queue.get()
+                    if entry is None:
+                        break
+
+                    item, results, error = entry
+
+                    if results is not None:
+                        postprocess_results(results)
+                        self.remember_posts(item, results)
+                        self.write(outfile, results, num_written)
+                        outfile.flush()
+                        os.fsync(outfile.fileno())
+                        num_written += 1
+
+                    # Commit status of the item after its results are on disk, with the size of the output up to them
+                    if item is not None:
+                        self.mark(item, 'failed' if error else 'done', error or '', output_offset=outfile.tell())
+
+                if self.output_format=='json':
+                    outfile.write('\n}\n')
+
+        except Exception as e:
+            self.error = e
+
+    def run_parquet(self):
+        """
+            Write results from the queue to a parquet dataset. Items are marked as done, when the part file that
+            contains their results is complete. With a work queue, parts are completed well before the leases of their
+            items expire.
+        """
+        max_part_seconds = 60
+        if self.work_queue is not None:
+            max_part_seconds = min(max_part_seconds, self.work_queue.lease_timeout / 4)
+
+        output = ParquetOutput(self.output_path, append=self.resume, max_part_seconds=max_part_seconds)
+
+        while True:
+            try:
+                entry = self.queue.get(timeout=1)
+            except Empty:
+                # Complete a part that is due, even if no further results arrive
+                for done_item in output.complete_if_due():
+                    self.mark(done_item, 'done')
+                continue
+
+            if entry is None:
+                break
+
+            item, results, error = entry
+
+            if error:
+                self.mark(item, 'failed', error)
+            elif results is not None:
+                postprocess_results(results)
+                self.remember_posts(item, results)
+                for done_item in output.write(results, item):
+                    self.mark(done_item, 'done')
+
+        for done_item in output.close():
+            self.mark(done_item, 'done')
+
+    def mark(self, item, status, error='', output_offset=None):
+        """
+            Mark the item in the ledger and acknowledge it in the work queue.
+        """
+        self.ledger.mark(item, status, error, output_offset)
+
+        with self.leased_items_lock:
+            self.leased_items.discard(item)
+
+        # Posts of the item are known to the next runs only once they are saved
+        post_ids = self.pending_post_ids.pop(item, None)
+        if post_ids is not None and status == 'done':
+            self.post_index.add(item, post_ids)
 
-    def update(self, scraping_results, results):
+        if self.work_queue is not None:
+            if status == 'done':
+                self.work_queue.ack(item)
+            else:
+                self.work_queue.nack(item, error)
+
+    def remember_posts(self, item, results):
+        """
+            Keep the post ids of hashtag results until the item is marked as done.
+        """
+        if self.post_index is not None and item is not None and isinstance(results, HashtagScrapingResult):
+            self.pending_post_ids[item] = list((results.hashtag_posts or {}).keys())
+
+    def open_output(self):
+        """
+            Open the output file. Returns the file and the number of results that it already contains. On resume, the
+            output is cut back to the results of the last item that has been marked in the ledger, so that results
+            written before a crash, but not marked, are neither incomplete nor written twice.
+        """
+        if self.resume and os.path.exists(self.output_path):
+            output_offset = self.ledger.output_offset()
+
+            with open(self.output_path, 'rb+') as infile:
+                if output_offset is not None:
+                    content = infile.read(output_offset)
+                else:
+                    content = self.drop_incomplete_entries(infile.read())
+
+                infile.truncate(len(content))
+
+            if content.strip() not in [b'', b'{']:
+                return open(self.output_path, 'a', newline=''), 1
+
+        outfile = open(self.output_path, 'w', newline='')
+        if self.output_format=='json':
+            outfile.write('{')
+            outfile.flush()
+
+        return outfile, 0
+
+    def drop_incomplete_entries(self, content):
+        """
+            Helper to cut an output without offsets in the ledger (e.g. of an earlier version) back to its complete
+            entries. Every entry is on its own line.
+        """
+        if self.output_format!='json':
+            # Drop an incomplete last line
+            return content[:content.rfind(b'\n') + 1]
+
+        # Keep the lines of the json object up to the first one that is not a complete entry
+        lines = content.split(b'\n')
+        if lines[0].strip() != b'{':
+            return b''
+
+        entries = []
+        for line in lines[1:]:
+            entry = line.rstrip().rstrip(b',')
+            if not entry:
+                break
+            try:
+                json.loads(b'{' + entry + b'}')
+            except ValueError:
+                break
+            entries.append(entry)
+
+        return b'\n'.join([b'{'] + entries)
+
+    def write(self, outfile, results, num_written):
         if self.output_format=='csv':
-            # Write results to csv
-            scraping_results = scraping_results.append(results.as_dataframe())
-        
+            # Append rows to csv, header only once
+            results.as_dataframe().to_csv(outfile, index=False, header=num_written==0)
+
         elif self.output_format=='json':
-            # Write results to json
-            scraping_results = {**scraping_results, **results.as_json()}
+            # Append entries to the json object
+            for key, value in results.as_json().items():
+                separator = '\n' if num_written==0 else ',\n'
+                outfile.write(separator + json.dumps(key) + ': ' + json.dumps(value))
+
+        elif self.output_format=='jsonl':
+            # Append one line per result
+            outfile.write(json.dumps(results.as_json()) + '\n')
+
+    def is_done(self, item):
+        """
+            Check, if the item has been scraped in this or a previous run.
+        """
+        if self.ledger.status(item) != 'done':
+            return False
+
+        # Written before, but not acknowledged, e.g. after a crash
+        if self.work_queue is not None:
+            self.work_queue.ack(item)
+
+        return True
+
+    def begin(self, item):
+        """
+            Mark the item as pending.
+        """
+        self.check_error()
+        self.ledger.mark(item, 'pending')
+
+        if self.work_queue is not None:
+            with self.leased_items_lock:
+                self.leased_items.add(item)
+
+    def heartbeat(self):
+        """
+            Renew the leases of the items in progress every third of the lease timeout, so that items that take long
+            to scrape or to be written are not leased by another node in the meantime.
+        """
+        while not self.heartbeat_stopped.wait(self.work_queue.lease_timeout / 3):
+            with self.leased_items_lock:
+                items = list(self.leased_items)
+
+            for item in items:
+                try:
+                    self.work_queue.renew(item)
+                except Exception as e:
+                    print("Renewing the lease of " + item + " failed: " + type(e).__name__ + ": " + str(e))
+
+    def update(self, results, item=None):
+        """
+            Queue results for writing. The item is marked as done after the results have been written.
+        """
+        self.check_error()
+        self.queue.put((item, results, None))
+
+    def fail(self, item, error):
+        """
+            Mark the item as failed.
+        """
+        self.check_error()
+        self.queue.put((item, None, error))
+
+    def check_error(self):
+        """
+            Raise the error of the writer thread, so that the scrapers stop as soon as nothing can be written anymore.
+        """
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        """
+            Write all remaining results and finish the output file.
+        """
+        self.queue.put(None)
+        self.join()
+        self.heartbeat_stopped.set()
+
+        print("Jobs: " + json.dumps(self.ledger.counts()))
+        self.ledger.close()
+
+        if self.post_index is not None:
+            self.post_index.close()
+
+        if self.work_queue is not None:
+            print("Work queue: " + json.dumps(self.work_queue.counts()))
+
+        if self.error is not None:
+            raise self.error
+
+def normalize_company_url(company_url):
+    """
+        Helper to get a unique key for a company url, independent of scheme, query string and trailing slash.
+    """
+    parts = urlsplit(company_url.strip())
+    return parts.netloc.lower() + parts.path.rstrip('/').lower()
+
+class CompanyCache():
+    """
+        Cache for company details, keyed by the normalized company url. Entries are held in memory in least recently
+        used order and stored in a sqlite file, so that they survive restarts. Entries older than ttl seconds are
+        scraped again. Both the memory and the file keep at most max_size entries.
+    """
+
+    def __init__(self, cache_file, ttl=30*24*60*60, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self.memory = OrderedDict()
+        self.lock = Lock()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+
+        # On-disk store
+        self.connection = sqlite3.connect(cache_file, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS companies (key TEXT PRIMARY KEY, industry TEXT, employees TEXT, scraped_at REAL)")
+        self.connection.commit()
+
+    def get(self, company_url):
+        """
+            Return (industry, employees) of a company, or None if the company is not cached or expired.
+        """
+        key = normalize_company_url(company_url)
+
+        with self.lock:
+            entry = self.memory.get(key)
+
+            # Fall back to the on-disk store
+            if entry is None:
+                row = self.connection.execute("SELECT industry, employees, scraped_at FROM companies WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = row
+                    self.remember(key, entry)
+
+            if entry is None or time.time() - entry[2] > self.ttl:
+                self.misses += 1
+                return None
+
+            self.memory.move_to_end(key)
+            self.hits += 1
+
+            return entry[0], entry[1]
+
+    def contains(self, company_url):
+        """
+            Check, if a company is cached and not expired, without counting a hit or miss.
+        """
+        key = normalize_company_url(company_url)
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                entry = self.connection.execute("SELECT industry, employees, scraped_at FROM companies WHERE key = ?", (key,)).fetchone()
+
+        return entry is not None and time.time() - entry[2] <= self.ttl
+
+    def put(self, company_url, company_industry, company_employees):
+        key = normalize_company_url(company_url)
+        entry = (company_industry, company_employees, time.time())
+
+        with self.lock:
+            self.remember(key, entry)
+
+            self.connection.execute("INSERT OR REPLACE INTO companies VALUES (?, ?, ?, ?)", (key,) + entry)
+            self.connection.execute("DELETE FROM companies WHERE key NOT IN (SELECT key FROM companies ORDER BY scraped_at DESC LIMIT ?)", (self.max_size,))
+            self.connection.commit()
+
+    def remember(self, key, entry):
+        # Keep entry in memory and evict the least recently used ones
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, size=len(self.memory))
+
+    def close(self):
+        self.connection.close()
+
+def get_content_hash(content):
+    """
+        Helper to hash a text or a json serializable value, e.g. to detect changes of a profile.
+    """
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True)
+
+    return hashlib.sha1(bytes(content, encoding='utf-8')).hexdigest()
+
+class ProfileStore():
+    """
+        Store of the last result of each profile, stored in a sqlite file. Besides the result, it keeps the time of
+        the last scrape, a hash of the extracted content and a fingerprint of the page before it was expanded, so that
+        an unchanged profile can be recognized without expanding it again.
+    """
+
+    def __init__(self, store_file):
+        self.lock = Lock()
+
+        self.connection = sqlite3.connect(store_file, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS profiles (profile TEXT PRIMARY KEY, scraped_at REAL, changed_at REAL, content_hash TEXT, fingerprint TEXT, scraping_date TEXT, profile_information TEXT)")
+        self.connection.commit()
+
+    def get(self, profile):
+        """
+            Return the stored entry of a profile as dict, or None if the profile has not been scraped before.
+        """
+        with self.lock:
+            row = self.connection.execute("SELECT scraped_at, changed_at, content_hash, fingerprint, scraping_date, profile_information FROM profiles WHERE profile = ?", (profile,)).fetchone()
+
+        if row is None:
+            return None
+
+        return dict(scraped_at=row[0], changed_at=row[1], content_hash=row[2], fingerprint=row[3], scraping_date=row[4], profile_information=json.loads(row[5]))
+
+    def put(self, profile_results, fingerprint=''):
+        """
+            Store the result of a profile. Returns, if its content has changed since the last scrape.
+        """
+        content_hash = get_content_hash(profile_results.profile_information)
+        now = time.time()
+
+        with self.lock:
+            row = self.connection.execute("SELECT content_hash, changed_at FROM profiles WHERE profile = ?", (profile_results.profile,)).fetchone()
+            changed = row is None or row[0] != content_hash
+
+            self.connection.execute("INSERT OR REPLACE INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (profile_results.profile, now, now if changed else row[1], content_hash, fingerprint,
+                                     profile_results.scraping_date, json.dumps(profile_results.profile_information)))
+            self.connection.commit()
+
+        return changed
+
+    def close(self):
+        self.connection.close()
+
+def get_post_id(data_id):
+    """
+        Helper to create a stable id of a post by hashing its data id.
+    """
+    return hashlib.sha1(bytes(data_id, encoding='utf-8')).hexdigest()
+
+def parse_raw_posts(raw_posts):
+    """
+        Helper to turn the raw fields of the posts of a feed into posts, keyed by post id. Posts with missing fields
+        are skipped. Returns the posts and the number of failures per field.
+    """
+
+    # Initialize dict and per-field failure counter
+    posts = {}
+    failures = {}
+
+    for raw_post in raw_posts:
+        # Count failed fields and skip incomplete posts
+        if raw_post['errors']:
+            for field in raw_post['errors']:
+                failures[field] = failures.get(field, 0) + 1
+            continue
+
+        data_id = raw_post['data_id']
+
+        # Create hash from data_id and use it as id
+        post_id = get_post_id(data_id)
+
+        # Create post object with the raw strings, they are cleaned in the post-processing
+        post = Post(username=raw_post['username'],
+                    user_profile_id=get_userprofileid_from_userurl(raw_post['user_url']),
+                    userdescription=raw_post['userdescription'],
+                    published=raw_post['published'],
+                    text=raw_post['text'],
+                    data_id = data_id
+                )
+
+        # Convert to json
+        posts[post_id] = post.as_json()
+
+    return posts, failures
+
+def build_jobs(raw_jobs, company_details):
+    """
+        Helper to turn the raw jobs [position, company_name, company_url, date_range, location] of a profile into jobs.
+        company_details is a function that returns (industry, employees) of a company url. Jobs without company url
+        are skipped.
+    """
+
+    clean_jobs = []
+    for job in raw_jobs:
+        if job[2] != '':
+            clean_jobs.append(job)
+
+    parsed_jobs = []
+    for job in clean_jobs:
+        company_industry, company_employees = company_details(job[2])
+
+        # Get company information
+        cmp_obj = Company(
+            name=job[1],
+            industry=company_industry,
+            employees=company_employees
+        )
+        cmp_dict = cmp_obj.reprJSON()
+
+        # Get location information, city and country are split in the post-processing
+        loc_obj = Location(job[4])
+        loc_dict = loc_obj.reprJSON()
+
+        # Combine to job object
+        job_obj = Job(position=job[0],
+            company=cmp_dict,
+            location=loc_dict,
+            date_range=job[3]
+        )
+        job_dict = job_obj.reprJSON()
+
+        # Update list
+        parsed_jobs.append(job_dict)
+
+    return parsed_jobs
+
+def split_locations(locations):
+    """
+        Helper to split many locations 'City, Region, Country' into cities and countries. Locations without comma have
+        neither. Each distinct location is split once, as the same locations recur across jobs.
+    """
+    splits = {}
+    for location in set(locations):
+        parts = location.split(',')
+        splits[location] = (parts[0].strip(), parts[-1].strip()) if len(parts) > 1 else ('', '')
 
+    return [splits[location][0] for location in locations], [splits[location][1] for location in locations]
+
+# Age of a post as shown in the feed, e.g. '3d', '1w • Edited' or '2mo'
+RELATIVE_TIME_REGEX = re.compile(r'^\s*(\d+)\s*(mo|yr|s|m|h|d|w|y)\b')
+
+# Seconds per unit of a relative time, months and years are approximate
+RELATIVE_TIME_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400, 'mo': 30 * 86400, 'yr': 365 * 86400, 'y': 365 * 86400}
+
+def parse_published(published, scraping_date):
+    """
+        Helper to turn the relative ages of many posts into absolute dates, counted back from the date of scraping.
+        The dates are only as precise as the unit of the age. Unknown ages give ''.
+    """
+    now = datetime.strptime(scraping_date, DATE_FORMAT)
+
+    # Feeds show few distinct ages, so convert each of them once
+    dates = {}
+    for value in set(published):
+        match = RELATIVE_TIME_REGEX.match(value)
+        if match:
+            seconds = int(match.group(1)) * RELATIVE_TIME_UNITS[match.group(2)]
+            dates[value] = (now - timedelta(seconds=seconds)).strftime(DATE_FORMAT)
         else:
-            sys.exit("Output format not specified.")
+            dates[value] = ''
 
-        return scraping_results
+    return [dates[value] for value in published]
 
-    def save_to_file(self,scraping_results, output_file):
-        # Save to file
-        if self.output_format=='csv':
-            scraping_results.to_csv(self.output_folder + output_file + '.csv',index=False)
-        elif self.output_format=='json':
-            with open(self.output_folder + output_file + '.json', 'w') as outfile:
-                json.dump(scraping_results, outfile,indent=4)
+# Number of followers, e.g. '1,234 followers' or '12.5K followers'
+FOLLOWER_COUNT_REGEX = re.compile(r'(\d[\d,.]*)\s*([KkMm])?\b')
+
+def parse_follower_count(hashtag_follower):
+    """
+        Helper to get the number of followers of a hashtag from its follower text. Returns None, if there is no number.
+    """
+    match = FOLLOWER_COUNT_REGEX.search(hashtag_follower or '')
+    if not match:
+        return None
+
+    number, suffix = match.groups()
+    if suffix:
+        return int(float(number.replace(',', '')) * (1000 if suffix.lower() == 'k' else 1000000))
+
+    return int(re.sub(r'[^\d]', '', number))
+
+def postprocess_results(results):
+    """
+        Clean the raw strings of a result in bulk after extraction: escape characters are removed from the fields of
+        all posts at once, the age of each post is turned into a date, the follower text into a number and the job
+        locations are split into city and country. Other results (e.g. snapshots) are left as they are.
+    """
+    if isinstance(results, HashtagScrapingResult):
+        posts = list((results.hashtag_posts or {}).values())
+
+        for field in ['username', 'userdescription', 'published', 'text']:
+            for post, value in zip(posts, remove_escapes_batch([post[field] for post in posts])):
+                post[field] = value
+
+        results.scraping_date = remove_escapes(results.scraping_date)
+        for post, published_at in zip(posts, parse_published([post['published'] for post in posts], results.scraping_date)):
+            post['published_at'] = published_at
+
+        results.hashtag_follower = remove_escapes(results.hashtag_follower or '')
+        results.hashtag_follower_count = parse_follower_count(results.hashtag_follower)
+
+    elif isinstance(results, ProfileScrapingResult) and not results.is_error():
+        locations = [job['location'] for job in results.profile_information['jobs']]
+
+        cities, countries = split_locations([location['location'] for location in locations])
+        for location, city, country in zip(locations, cities, countries):
+            location['city'] = city
+            location['country'] = country
+
+    return results
+
+class Snapshot():
+    """
+        DOM of an expanded hashtag feed or profile, stored as gzipped json in the folder snapshots/<kind> of the output
+        folder, so that it can be parsed later (see Parser.py). metadata holds what cannot be taken from the page, e.g.
+        the number of scrolls or the details of the companies that were looked up while scraping.
+    """
+
+    def __init__(self, kind, item, url, scraping_date, html, metadata=None):
+        self.kind = kind
+        self.item = item
+        self.url = url
+        self.scraping_date = scraping_date
+        self.html = html
+        self.metadata = metadata or {}
+        self.path = None
+
+    def save(self, output_folder):
+        """
+            Write the snapshot. The file is written under a temporary name and renamed when complete.
+        """
+        folder = output_folder + 'snapshots/' + self.kind + '/'
+        os.makedirs(folder, exist_ok=True)
+
+        self.path = folder + safe_filename(self.item) + '.json.gz'
+        with gzip.open(self.path + '.tmp', 'wt', encoding='utf-8') as outfile:
+            json.dump(dict(kind=self.kind, item=self.item, url=self.url, scraping_date=self.scraping_date,
+                           html=self.html, metadata=self.metadata), outfile)
+        os.replace(self.path + '.tmp', self.path)
+
+        return self.path
+
+    @staticmethod
+    def load(path):
+        with gzip.open(path, 'rt', encoding='utf-8') as infile:
+            data = json.load(infile)
+
+        snapshot = Snapshot(data['kind'], data['item'], data['url'], data['scraping_date'], data['html'], data['metadata'])
+        snapshot.path = path
+
+        return snapshot
+
+    def as_json(self):
+        # Entry of the snapshot index
+        d = {}
+        d[self.item] = {
+            'url':self.url,
+            'scraping_date':self.scraping_date,
+            'snapshot':self.path
+        }
+        return d
+
+class PostIndex():
+    """
+        Index of the posts per hashtag that have been scraped before, stored in a sqlite file.
+    """
+
+    def __init__(self, index_file):
+        self.lock = Lock()
+
+        self.connection = sqlite3.connect(index_file, check_same_thread=False)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS posts (hashtag TEXT, post_id TEXT, first_seen REAL, PRIMARY KEY (hashtag, post_id))")
+        self.connection.commit()
+
+    def known_post_ids(self, hashtag):
+        with self.lock:
+            rows = self.connection.execute("SELECT post_id FROM posts WHERE hashtag = ?", (hashtag,)).fetchall()
+
+        return set(row[0] for row in rows)
+
+    def add(self, hashtag, post_ids):
+        now = time.time()
+
+        with self.lock:
+            self.connection.executemany("INSERT OR IGNORE INTO posts VALUES (?, ?, ?)", [(hashtag, post_id, now) for post_id in post_ids])
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+def as_queue(items):
+    """
+        Helper to get a queue of the items. Queues and work queues are used as they are.
+    """
+    if isinstance(items, (Queue, WorkQueue)):
+        return items
+
+    return fill_queue(items)
+
+def fill_queue(items):
+    """
+        Helper to put all items into a new queue.
+    """
+    queue = Queue()
+    for item in items:
+        queue.put(item)
+
+    return queue
+
+class StreamingQueue(Queue):
+    """
+        Queue that is filled from an iterable by a background thread, holding at most maxsize items at a time.
+    """
+
+    def __init__(self, items, maxsize=1000):
+        Queue.__init__(self, maxsize=maxsize)
+
+        self.finished = Event()
+        self.error = None
+
+        Thread(target=self.feed, args=(items,), daemon=True).start()
+
+    def feed(self, items):
+        try:
+            for item in items:
+                self.put(item)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.finished.set()
+
+def iterate_queue(queue):
+    """
+        Helper to iterate over a queue until it is empty. Several threads can iterate over the same queue. A streaming
+        queue is iterated until it is empty and its input is exhausted.
+    """
+    if isinstance(queue, WorkQueue):
+        yield from queue.iterate()
+        return
+
+    while True:
+        # Check before taking an item, as the last items might be added in between
+        finished = not isinstance(queue, StreamingQueue) or queue.finished.is_set()
+
+        try:
+            yield queue.get_nowait()
+        except Empty:
+            if finished:
+                if getattr(queue, 'error', None) is not None:
+                    raise queue.error
+                return
+
+            queue.finished.wait(0.05)
+
+def iterate_queue_with_lookahead(queue, size):
+    """
+        Helper to iterate over a queue like iterate_queue, but yield each item together with the list of up to size
+        items that follow it. The following items are taken from the queue already.
+    """
+    upcoming = deque()
+
+    for item in iterate_queue(queue):
+        upcoming.append(item)
+        if len(upcoming) > size:
+            yield upcoming.popleft(), list(upcoming)
+
+    while upcoming:
+        yield upcoming.popleft(), list(upcoming)
+
+def normalize_input(line, kind):
+    """
+        Helper to normalize a line of the input: Whitespace and escape characters are removed, hashtags are lowercased
+        without a leading #, profile urls are reduced to the profile id. Returns '' for empty lines.
+    """
+    item = remove_escapes(line).strip()
+
+    if kind == 'hashtags':
+        return item.lstrip('#').lower()
+
+    if '/in/' in item:
+        item = item.split('/in/')[1]
+
+    return item.split('?')[0].strip('/')
+
+def get_shard(item, num_shards):
+    """
+        Helper to get the shard of an item. The hash is stable across processes and machines.
+    """
+    return int(hashlib.sha1(item.encode('utf-8')).hexdigest()[:15], 16) % num_shards
+
+class SeenItems():
+    """
+        Set of the items seen so far, kept in a temporary sqlite database. Unlike a set in memory, it stays small in
+        memory for millions of items, as sqlite only caches cache_size_kb of its pages.
+    """
+
+    def __init__(self, cache_size_kb=16384):
+        self.connection = sqlite3.connect('', check_same_thread=False)
+        self.connection.execute("PRAGMA cache_size = -" + str(int(cache_size_kb)))
+        self.connection.execute("CREATE TABLE seen (item TEXT PRIMARY KEY)")
+
+    def add(self, item):
+        """
+            Add the item. Returns, if it has not been seen before.
+        """
+        return self.connection.execute("INSERT OR IGNORE INTO seen VALUES (?)", (item,)).rowcount == 1
+
+    def close(self):
+        self.connection.close()
+
+def read_input(input_file, kind, shard_index=0, num_shards=1):
+    """
+        Read the items of the input file one by one: Normalized, without duplicates and, if num_shards is greater
+        than 1, only the items of shard shard_index (0 to num_shards - 1).
+    """
+    seen = SeenItems()
+    duplicates = 0
+
+    try:
+        with open(input_file, 'r') as infile:
+            for line in infile:
+                item = normalize_input(line, kind)
+                if item == '':
+                    continue
+
+                # Items of other shards are scraped by other containers
+                if num_shards > 1 and get_shard(item, num_shards) != shard_index:
+                    continue
+
+                if not seen.add(item):
+                    duplicates += 1
+                    continue
+
+                yield item
+
+    finally:
+        seen.close()
+
+        if duplicates:
+            print("Skipped " + str(duplicates) + " duplicate items of " + input_file)
 
 def get_userprofileid_from_userurl(user_url):
     """
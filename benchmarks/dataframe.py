@@ -0,0 +1,47 @@
+"""
+    Benchmark for the construction of the flat hashtag dataframe.
+
+    Run from the repository root with
+
+        python benchmarks/dataframe.py
+
+    The time per post should stay roughly constant when the number of posts grows.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from utils import HashtagScrapingResult, Post, hashtag_results_as_dataframe
+
+def make_result(hashtag, num_posts):
+    posts = {}
+    for i in range(num_posts):
+        post = Post(username='User ' + str(i),
+                    user_profile_id='user-' + str(i),
+                    userdescription='Description of user ' + str(i),
+                    published='3d',
+                    text='Text of post ' + str(i) + ' #' + hashtag,
+                    data_id='urn:li:activity:' + str(i)
+                )
+        posts['post-' + str(i)] = post.as_json()
+
+    return HashtagScrapingResult(hashtag=hashtag, hashtag_follower='1,234 followers', scraping_date='2020-01-01 00-00-00', hashtag_posts=posts)
+
+if __name__ == '__main__':
+    # Warm up, so that the import of pandas is not timed with the first size
+    hashtag_results_as_dataframe([make_result('warmup', 10)])
+
+    print('{:>10} {:>12} {:>16}'.format('posts', 'seconds', 'microsec/post'))
+
+    for num_posts in [1000, 10000, 100000]:
+        # Split posts over several hashtags, as in a real run
+        results = [make_result('hashtag' + str(i), num_posts // 10) for i in range(10)]
+
+        start = time.perf_counter()
+        df = hashtag_results_as_dataframe(results)
+        duration = time.perf_counter() - start
+
+        assert len(df) == num_posts
+        print('{:>10} {:>12.3f} {:>16.2f}'.format(num_posts, duration, duration / num_posts * 1e6))
@@ -0,0 +1,254 @@
+"""
+    Local stand-in for LinkedIn to run the scrapers offline.
+
+    Serves the login, feed, hashtag, profile and company pages with the markup the scrapers expect. Hashtag feeds load
+    more posts when scrolled to the bottom, and every request (and every click that loads content) is delayed by the
+    configured latency. Start it on its own with
+
+        python benchmarks/fake_linkedin.py --port 8000 --latency 0.2
+
+    and run the scrapers with LINKEDIN_URL=http://localhost:8000.
+"""
+import argparse
+import hashlib
+import random
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from urllib.parse import parse_qs, urlsplit
+
+# Number of posts per page of a hashtag feed
+POSTS_PER_PAGE = 10
+
+# Companies that the jobs of the profiles are drawn from
+NUM_COMPANIES = 20
+
+PAGE = """<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body style="margin:0">{body}</body></html>"""
+
+LOGIN_BODY = """
+<form method="post" action="/checkpoint/lg/login-submit">
+    <input id="username" name="session_key" type="text">
+    <input id="password" name="session_password" type="password">
+</form>"""
+
+FEED_BODY = """<div style="height:3000px">Feed</div>"""
+
+HASHTAG_BODY = """
+<div class="core-rail"><div><div><div><div></div><div><div></div><div>{followers} followers</div></div></div></div></div></div>
+<div id="feed">{posts}</div>
+<script>
+    var page = 1, loading = false;
+    window.addEventListener('scroll', function() {{
+        if (loading || page >= {num_pages}) return;
+        if (window.scrollY + window.innerHeight < document.body.offsetHeight - 200) return;
+        loading = true;
+        fetch('/fake/posts?keywords={hashtag}&page=' + page).then(function(r) {{ return r.text(); }}).then(function(html) {{
+            document.getElementById('feed').insertAdjacentHTML('beforeend', html);
+            page += 1;
+            loading = false;
+        }});
+    }});
+</script>"""
+
+POST = """
+<div data-id="urn:li:activity:{activity}" style="min-height:400px">
+    <a class="app-aware-link" href="/in/{user}?miniProfileUrn=urn"><span class="feed-shared-actor__name">{name}</span></a>
+    <span class="feed-shared-actor__description">{name} works on {hashtag}</span>
+    <span class="feed-shared-actor__sub-description">{age}d &bull; Edited</span>
+    <div class="feed-shared-text">Post {index} about #{hashtag}</div>
+</div>"""
+
+PROFILE_BODY = """
+<ul class="pv-top-card--list"><li>{name}</li></ul>
+<ul class="pv-top-card--experience-list"><li><a><span></span><span>{employer}</span></a></li></ul>
+<a href="#" onclick="setTimeout(function() {{ document.getElementById('modal').innerHTML = document.getElementById('contact').innerHTML; }}, {latency_ms}); return false;">Contact info</a>
+<div id="modal"></div>
+<template id="contact">
+    <section class="pv-contact-info__contact-type ci-email"><span></span><header>Email</header><div><a>{user}@example.com</a></div></section>
+    <button class="artdeco-modal__dismiss" onclick="document.getElementById('modal').innerHTML = '';">Dismiss</button>
+</template>
+<section id="experience-section" style="min-height:1500px"><ul>{jobs}</ul>
+    <button class="pv-profile-section__see-more-inline" onclick="var el = this; setTimeout(function() {{ el.insertAdjacentHTML('afterend', '<div>More</div>'); el.remove(); }}, {latency_ms});">See more</button>
+</section>
+<section style="min-height:1500px">
+    <ul id="skills">{skills}</ul>
+    <button class="pv-skills-section__additional-skills" onclick="setTimeout(function() {{ document.getElementById('skills').innerHTML = document.getElementById('all-skills').innerHTML; }}, {latency_ms});">Show more</button>
+    <template id="all-skills">{all_skills}</template>
+</section>"""
+
+JOB = """
+<li><a href="/company/{company}/"><div class="pv-entity__summary-info">
+    <h3>{position}</h3>
+    <p class="pv-entity__secondary-title">{company_name}</p>
+    <h4 class="pv-entity__date-range"><span>Dates Employed</span><span>Jan {start} &ndash; Dec {end}</span></h4>
+    <h4 class="pv-entity__location"><span>Location</span><span>{city}, Germany</span></h4>
+</div></a></li>"""
+
+SKILL = """<li class="pv-skill-category-entity"><span class="pv-skill-category-entity__name-text">{skill}</span></li>"""
+
+COMPANY_BODY = """
+<div class="org-top-card-summary-info-list__info-item">{industry}</div>
+<a data-control-name="topcard_see_all_employees">See all {employees} employees on LinkedIn</a>"""
+
+SKILLS = ['Python', 'SQL', 'Docker', 'Selenium', 'Pandas', 'Statistics', 'Leadership', 'Scrum']
+CITIES = ['Berlin', 'Hamburg', 'Munich', 'Cologne']
+
+def seed(*parts):
+    """
+        Helper to get a stable random generator for a page, so that every load of a page returns the same content.
+    """
+    return random.Random(hashlib.sha1('/'.join(str(part) for part in parts).encode('utf-8')).hexdigest())
+
+class FakeLinkedInHandler(BaseHTTPRequestHandler):
+
+    # Set by start_server
+    latency = 0.0
+    num_posts = 100
+    human_check_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        time.sleep(self.latency)
+
+        if self.path.startswith('/checkpoint/lg/login-submit'):
+            length = int(self.headers.get('Content-Length', 0))
+            form = parse_qs(self.rfile.read(length).decode('utf-8'))
+            token = hashlib.sha1(form.get('session_key', [''])[0].encode('utf-8')).hexdigest()
+            self.redirect('/feed/', cookie='li_at=' + token + '; Path=/')
+        else:
+            self.send_error(404)
+
+    def do_GET(self):
+        time.sleep(self.latency)
+
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if url.path == '/uas/login':
+            return self.page('Login', LOGIN_BODY)
+
+        if url.path == '/':
+            return self.page('LinkedIn', '')
+
+        if url.path == '/in/unavailable/':
+            return self.page('Unavailable', 'This profile is not available')
+
+        if url.path.startswith('/checkpoint/challenge'):
+            return self.page('Security Verification', 'Let us do a quick security check')
+
+        # All other pages require a session
+        if 'li_at=' not in self.headers.get('Cookie', ''):
+            return self.redirect('/uas/login')
+
+        if random.random() < self.human_check_rate:
+            return self.redirect('/checkpoint/challenge/')
+
+        if url.path == '/feed/':
+            return self.page('Feed', FEED_BODY)
+
+        if url.path == '/feed/hashtag/':
+            return self.hashtag(query.get('keywords', [''])[0])
+
+        if url.path == '/fake/posts':
+            return self.send_html(self.posts(query.get('keywords', [''])[0], int(query.get('page', ['0'])[0])))
+
+        if url.path.startswith('/in/'):
+            return self.profile(url.path.split('/')[2])
+
+        if url.path.startswith('/company/'):
+            return self.company(url.path.split('/')[2])
+
+        self.send_error(404)
+
+    def hashtag(self, hashtag):
+        num_pages = (self.num_posts + POSTS_PER_PAGE - 1) // POSTS_PER_PAGE
+        followers = '{:,}'.format(seed('followers', hashtag).randint(100, 1000000))
+
+        body = HASHTAG_BODY.format(followers=followers, posts=self.posts(hashtag, 0), num_pages=num_pages, hashtag=hashtag)
+        self.page('#' + hashtag, body)
+
+    def posts(self, hashtag, page):
+        html = ''
+        for index in range(page * POSTS_PER_PAGE, min((page + 1) * POSTS_PER_PAGE, self.num_posts)):
+            rng = seed('post', hashtag, index)
+            user = 'user-' + str(rng.randint(0, 10000))
+            html += POST.format(activity=rng.randint(10**15, 10**16), user=user, name=user.replace('-', ' ').title(),
+                                hashtag=hashtag, age=index // POSTS_PER_PAGE + 1, index=index)
+
+        return html
+
+    def profile(self, user):
+        if user.startswith('unavailable'):
+            return self.redirect('/in/unavailable/')
+
+        rng = seed('profile', user)
+        name = user.replace('-', ' ').title()
+
+        jobs = ''
+        for i in range(3):
+            company = rng.randint(0, NUM_COMPANIES - 1)
+            jobs += JOB.format(company='company-' + str(company), company_name='Company ' + str(company),
+                               position='Position ' + str(i), start=2010 + 3 * i, end=2012 + 3 * i, city=rng.choice(CITIES))
+
+        skills = [SKILL.format(skill=skill) for skill in rng.sample(SKILLS, 5)]
+
+        body = PROFILE_BODY.format(name=name, user=user, employer='Company 0', jobs=jobs, skills=''.join(skills[:2]),
+                                   all_skills=''.join(skills), latency_ms=int(self.latency * 1000))
+        self.page(name, body)
+
+    def company(self, company):
+        rng = seed('company', company)
+        body = COMPANY_BODY.format(industry=rng.choice(['Software', 'Consulting', 'Retail']), employees='{:,}'.format(rng.randint(10, 100000)))
+        self.page(company, body)
+
+    def page(self, title, body):
+        self.send_html(PAGE.format(title=title, body=body))
+
+    def send_html(self, html):
+        content = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def redirect(self, location, cookie=None):
+        self.send_response(302)
+        self.send_header('Location', location)
+        if cookie is not None:
+            self.send_header('Set-Cookie', cookie)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+def start_server(port=0, latency=0.0, num_posts=100, human_check_rate=0.0):
+    """
+        Start the server in a background thread. Returns the server and its base url.
+    """
+    handler = type('Handler', (FakeLinkedInHandler,), dict(latency=latency, num_posts=num_posts, human_check_rate=human_check_rate))
+
+    server = ThreadingHTTPServer(('localhost', port), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, 'http://localhost:' + str(server.server_address[1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for LinkedIn.')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of every request in seconds')
+    parser.add_argument('--posts', type=int, default=100, help='number of posts per hashtag')
+    parser.add_argument('--human-check-rate', type=float, default=0.0, help='share of requests redirected to a human check')
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.port, args.latency, args.posts, args.human_check_rate)
+    print('Serving fake LinkedIn on ' + base_url)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
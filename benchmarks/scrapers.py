@@ -0,0 +1,145 @@
+"""
+    End-to-end benchmark of both scrapers against the local fake LinkedIn server (see fake_linkedin.py).
+
+    Requires Chrome and the packages of requirements.txt. Run from the repository root with
+
+        python benchmarks/scrapers.py --scraper both --items 20 --latency 0.1
+
+    For each scraper, the throughput in items per minute, the WebDriver round trips per item and the peak memory of
+    the scraper process and its browsers are printed.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from collections import Counter
+from threading import Event, Thread
+
+from fake_linkedin import start_server
+
+def process_tree_rss():
+    """
+        Helper to get the resident memory of this process and all its children (chromedriver and Chrome) in MB.
+        Requires psutil, returns None without it.
+    """
+    try:
+        import psutil
+    except ImportError:
+        return None
+
+    process = psutil.Process()
+    rss = process.memory_info().rss
+    for child in process.children(recursive=True):
+        try:
+            rss += child.memory_info().rss
+        except psutil.Error:
+            pass
+
+    return rss / 1024 / 1024
+
+class PeakMemory(Thread):
+    """
+        Sample the memory of the process tree until stopped and keep the maximum.
+    """
+
+    def __init__(self, interval=0.2):
+        Thread.__init__(self, daemon=True)
+        self.interval = interval
+        self.peak = None
+        self.stopped = Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            rss = process_tree_rss()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+        # Fall back to the peak of this process only
+        if self.peak is None:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+        return self.peak
+
+def count_commands(browser, counter):
+    """
+        Count every WebDriver command of the browser, as each of them is one HTTP round trip to chromedriver.
+    """
+    execute = browser.execute
+
+    def counted_execute(driver_command, params=None):
+        counter[driver_command] += 1
+        return execute(driver_command, params)
+
+    browser.execute = counted_execute
+
+def run_scraper(scraper_class, items, output_folder, **kwargs):
+    counter = Counter()
+
+    scraper = scraper_class('benchmark@example.com', 'password', items, output_format='jsonl', output_folder=output_folder, **kwargs)
+    count_commands(scraper.browser, counter)
+
+    peak_memory = PeakMemory()
+    peak_memory.start()
+
+    start = time.perf_counter()
+    scraper.start()
+    scraper.join()
+    duration = time.perf_counter() - start
+
+    return dict(
+        scraper=scraper_class.__name__,
+        items=len(items),
+        seconds=round(duration, 2),
+        items_per_minute=round(len(items) / duration * 60, 2),
+        round_trips_per_item=round(sum(counter.values()) / len(items), 1),
+        execute_script_per_item=round(sum(counter[command] for command in SCRIPT_COMMANDS) / len(items), 1),
+        navigations_per_item=round(counter['get'] / len(items), 1),
+        peak_memory_mb=round(peak_memory.stop(), 1)
+    )
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers against a local fake LinkedIn.')
+    parser.add_argument('--scraper', choices=['hashtags', 'profiles', 'both'], default='both')
+    parser.add_argument('--items', type=int, default=10, help='number of hashtags or profiles')
+    parser.add_argument('--latency', type=float, default=0.0, help='delay of every request in seconds')
+    parser.add_argument('--posts', type=int, default=100, help='number of posts per hashtag')
+    parser.add_argument('--scroll-depth', type=int, default=20)
+    parser.add_argument('--harvest-every', type=int, default=0, help='scrolls between harvesting and pruning posts')
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency, num_posts=args.posts)
+
+    # The base url has to be set before the scrapers are imported
+    os.environ['LINKEDIN_URL'] = base_url
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+    from Scraper import HashtagScraper, ProfileScraper, SCRIPT_COMMANDS
+
+    results = []
+    output_folder = tempfile.mkdtemp() + '/'
+
+    try:
+        if args.scraper in ['hashtags', 'both']:
+            hashtags = ['hashtag' + str(i) for i in range(args.items)]
+            results.append(run_scraper(HashtagScraper, hashtags, output_folder, scroll_depth=args.scroll_depth,
+                                       harvest_every=args.harvest_every))
+
+        if args.scraper in ['profiles', 'both']:
+            profiles = ['profile-' + str(i) for i in range(args.items)]
+            results.append(run_scraper(ProfileScraper, profiles, output_folder))
+
+    finally:
+        server.shutdown()
+        shutil.rmtree(output_folder)
+
+    for result in results:
+        print(json.dumps(result))
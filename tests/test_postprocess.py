@@ -0,0 +1,53 @@
+"""
+    Tests of the post-processing helpers, which turn the texts shown by LinkedIn into typed values.
+
+    Run from the repository root with
+
+        python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from utils import parse_follower_count, parse_published
+
+@pytest.mark.parametrize('hashtag_follower, count', [
+    ('1,234 followers', 1234),
+    ('12 followers', 12),
+    ('12K followers', 12000),
+    ('12k', 12000),
+    ('1.5M followers', 1500000),
+    ('1.5 M followers', 1500000),
+    # A word after the number is not a suffix, even if it starts with k or m
+    ('12 members', 12),
+    ('5 million followers', 5),
+    ('3 kilos', 3),
+    ('no followers', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_follower_count(hashtag_follower, count):
+    assert parse_follower_count(hashtag_follower) == count
+
+@pytest.mark.parametrize('published, date', [
+    ('30s', '2020-01-10 11-59-30'),
+    ('5m', '2020-01-10 11-55-00'),
+    ('2h', '2020-01-10 10-00-00'),
+    ('3d', '2020-01-07 12-00-00'),
+    ('1w • Edited', '2020-01-03 12-00-00'),
+    ('2mo', '2019-11-11 12-00-00'),
+    ('1yr', '2019-01-10 12-00-00'),
+    ('1y', '2019-01-10 12-00-00'),
+    # Unknown ages
+    ('3 days', ''),
+    ('Promoted', ''),
+    ('', ''),
+])
+def test_parse_published(published, date):
+    assert parse_published([published], '2020-01-10 12-00-00') == [date]
+
+def test_parse_published_keeps_order_of_repeated_ages():
+    assert parse_published(['3d', '5m', '3d'], '2020-01-10 12-00-00') == ['2020-01-07 12-00-00', '2020-01-10 11-55-00', '2020-01-07 12-00-00']
@@ -0,0 +1,121 @@
+"""
+    Tests of the scrolling of hashtag feeds, run against a fake browser that models a feed loading more posts at the
+    bottom.
+
+    Run from the repository root with
+
+        python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from Steps import COUNT_POSTS_SCRIPT, HashtagSteps, Script, WaitFor, run_steps
+
+class FakeFeed():
+    """
+        Feed of posts_per_page posts per page. When the view is at the bottom, the next page is loaded while waiting,
+        but only after load_waits waits, like on a slow network. After num_pages pages, the feed ends.
+    """
+
+    def __init__(self, num_pages, posts_per_page=10, post_height=400, window_height=1000, load_waits=1):
+        self.num_pages = num_pages
+        self.posts_per_page = posts_per_page
+        self.post_height = post_height
+        self.window_height = window_height
+        self.load_waits = load_waits
+
+        self.pages = 1
+        self.scroll_y = 0
+        self.waits_at_bottom = 0
+        self.waits_at_end = 0
+
+    def height(self):
+        return self.pages * self.posts_per_page * self.post_height
+
+    def execute(self, command):
+        if isinstance(command, WaitFor):
+            if self.scroll_y + self.window_height >= self.height():
+                if self.pages == self.num_pages:
+                    self.waits_at_end += 1
+                    return False
+
+                self.waits_at_bottom += 1
+                if self.waits_at_bottom >= self.load_waits:
+                    self.pages += 1
+                    self.waits_at_bottom = 0
+
+            return self.scroll_y + self.window_height < self.height()
+
+        assert isinstance(command, Script)
+
+        if command.script == "return window.innerHeight":
+            return self.window_height
+
+        if command.script == "return document.body.offsetHeight":
+            return self.height()
+
+        if command.script.startswith('window.scrollTo(0, '):
+            y = int(command.script[len('window.scrollTo(0, '):].split(')')[0])
+            self.scroll_y = max(0, min(y, self.height() - self.window_height))
+            return None
+
+        if command.script == COUNT_POSTS_SCRIPT:
+            return self.pages * self.posts_per_page
+
+        raise AssertionError('Unexpected script: ' + command.script)
+
+class Scraper(HashtagSteps):
+
+    def __init__(self, target_posts=None, max_idle_scrolls=3, scroll_depth=1000):
+        self.scroll_depth = scroll_depth
+        self.target_posts = target_posts
+        self.max_idle_scrolls = max_idle_scrolls
+        self.known_post_ids = set()
+        self.known_posts_run = 10
+        self.harvest_every = 0
+        self.harvested_posts = []
+
+def load_full_page(feed, **settings):
+    return run_steps(Scraper(**settings).load_full_page(), feed.execute)
+
+def test_scrolls_through_loaded_posts_to_target():
+    # 10 posts per page of 4000px, each page takes several scrolls of 1000px without new posts
+    feed = FakeFeed(num_pages=20)
+
+    load_full_page(feed, target_posts=100, max_idle_scrolls=3)
+
+    assert feed.pages * feed.posts_per_page == 100
+
+def test_waits_at_bottom_of_slow_feed():
+    # Each page loads only after two waits at the bottom
+    feed = FakeFeed(num_pages=20, load_waits=2)
+
+    load_full_page(feed, target_posts=50, max_idle_scrolls=3)
+
+    assert feed.pages * feed.posts_per_page == 50
+
+def test_stops_after_idle_scrolls_at_end_of_feed():
+    feed = FakeFeed(num_pages=3)
+
+    load_full_page(feed, target_posts=100, max_idle_scrolls=3)
+
+    assert feed.pages == 3
+    assert feed.waits_at_end == 3
+
+def test_stops_at_scroll_depth():
+    feed = FakeFeed(num_pages=20)
+
+    scrolls = load_full_page(feed, target_posts=100, scroll_depth=5)
+
+    assert scrolls == 6
+    assert feed.pages * feed.posts_per_page < 100
+
+def test_stops_at_bottom_without_target():
+    feed = FakeFeed(num_pages=3, load_waits=1)
+
+    load_full_page(feed)
+
+    assert feed.pages == 3
+    assert feed.waits_at_end == 1
@@ -0,0 +1,187 @@
+"""
+    Tests of the work queues against a sqlite file and a local stand-in of Redis (fakeredis).
+
+    Run from the repository root with
+
+        python -m pytest tests
+"""
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from utils import ResultsSaver
+from WorkQueue import RedisWorkQueue, SQLiteWorkQueue
+
+# Lease timeout of the tests in seconds, short enough to let leases expire
+LEASE_TIMEOUT = 0.2
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def make_queue(request, tmp_path):
+    """
+        Factory of work queues of one backend. Queues of the same name share their items, like queues on several nodes.
+    """
+    if request.param == 'sqlite':
+        def make(name='test', max_attempts=3):
+            return SQLiteWorkQueue(str(tmp_path / 'queue.sqlite'), name, lease_timeout=LEASE_TIMEOUT, max_attempts=max_attempts, poll_interval=0.01)
+    else:
+        fakeredis = pytest.importorskip('fakeredis')
+        server = fakeredis.FakeServer()
+
+        def make(name='test', max_attempts=3):
+            client = fakeredis.FakeRedis(server=server, decode_responses=True)
+            return RedisWorkQueue('redis://localhost', name, lease_timeout=LEASE_TIMEOUT, max_attempts=max_attempts, poll_interval=0.01, client=client)
+
+    return make
+
+def lease_all(queue):
+    items = []
+    while True:
+        item = queue.lease()
+        if item is None:
+            return items
+        items.append(item)
+
+def queue_counts(queue):
+    return dict(dict(queued=0, leased=0, done=0, dead=0), **queue.counts())
+
+def test_add_ignores_duplicates(make_queue):
+    queue = make_queue()
+    queue.add(['a', 'b', 'a'])
+    make_queue().add(['b', 'c'])
+
+    assert sorted(lease_all(queue)) == ['a', 'b', 'c']
+
+def test_lease_gives_each_item_once(make_queue):
+    first, second = make_queue(), make_queue()
+    first.add(['a', 'b'])
+
+    items = [first.lease(), second.lease()]
+
+    assert sorted(items) == ['a', 'b']
+    assert first.lease() is None
+    assert not first.is_drained()
+
+def test_ack_drains_queue(make_queue):
+    queue = make_queue()
+    queue.add(['a'])
+
+    queue.ack(queue.lease())
+
+    assert queue.is_drained()
+    assert queue.counts()['done'] == 1
+
+def test_expired_lease_is_leased_again(make_queue):
+    queue = make_queue()
+    queue.add(['a'])
+
+    assert queue.lease() == 'a'
+    assert queue.lease() is None
+
+    time.sleep(LEASE_TIMEOUT * 2)
+
+    assert queue.lease() == 'a'
+
+def test_renew_extends_lease(make_queue):
+    queue = make_queue()
+    queue.add(['a'])
+    queue.lease()
+
+    for i in range(4):
+        time.sleep(LEASE_TIMEOUT / 2)
+        assert queue.renew('a')
+
+    assert queue.lease() is None
+
+    queue.ack('a')
+    assert not queue.renew('a')
+
+def test_nack_retries_item(make_queue):
+    queue = make_queue()
+    queue.add(['a'])
+
+    queue.nack(queue.lease(), 'error')
+
+    assert queue.lease() == 'a'
+
+def test_dead_letter_after_max_attempts(make_queue):
+    queue = make_queue(max_attempts=2)
+    queue.add(['a', 'b'])
+
+    # a fails twice, b is not acknowledged within its leases
+    for attempt in range(2):
+        for item in lease_all(queue):
+            if item == 'a':
+                queue.nack(item, 'failed ' + str(attempt))
+        time.sleep(LEASE_TIMEOUT * 2)
+
+    assert queue.lease() is None
+    assert queue.is_drained()
+    assert queue.dead_letters() == {'a': 'failed 1', 'b': 'Lease expired'}
+
+def test_nack_after_ack_is_ignored(make_queue):
+    queue = make_queue()
+    queue.add(['a'])
+
+    item = queue.lease()
+    queue.ack(item)
+    queue.nack(item, 'late')
+
+    assert queue.lease() is None
+    assert queue.is_drained()
+
+def test_iterate_waits_for_leases_of_others(make_queue):
+    first, second = make_queue(), make_queue()
+    first.add(['a', 'b'])
+
+    # The item leased by the other node is leased again, once its lease expired
+    assert second.lease() is not None
+
+    items = []
+    for item in first.iterate():
+        items.append(item)
+        first.ack(item)
+
+    assert sorted(items) == ['a', 'b']
+
+def test_results_saver_renews_leases_until_done(make_queue, tmp_path):
+    queue, other = make_queue(), make_queue()
+    queue.add(['a'])
+
+    results_saver = ResultsSaver('jsonl', str(tmp_path) + '/', 'output', work_queue=queue)
+    results_saver.start()
+
+    item = queue.lease()
+    results_saver.begin(item)
+
+    # Scraping takes longer than the lease timeout
+    time.sleep(LEASE_TIMEOUT * 3)
+    assert other.lease() is None
+
+    results_saver.fail(item, 'error')
+    results_saver.close()
+
+    assert other.lease() == 'a'
+
+def test_late_renew_and_nack_are_ignored(make_queue):
+    first, second = make_queue(), make_queue()
+    first.add(['a'])
+
+    # The lease of the first worker expires and the item is leased by the second
+    assert first.lease() == 'a'
+    time.sleep(LEASE_TIMEOUT * 2)
+    assert second.lease() == 'a'
+
+    assert not first.renew('a')
+    first.nack('a', 'late')
+
+    assert first.lease() is None
+    assert second.renew('a')
+    assert queue_counts(second) == dict(queued=0, leased=1, done=0, dead=0)
+
+    second.ack('a')
+    assert second.is_drained()
+    assert second.dead_letters() == {}